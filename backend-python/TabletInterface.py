@@ -17,7 +17,8 @@ import asyncio
 import uvicorn
 import logging
 import os
-from typing import Callable, Any, Dict, Optional, Set, Literal, Coroutine, List
+import time
+from typing import Callable, Any, Dict, Optional, Set, Literal, Coroutine, List, Tuple
 
 # Configuracion de logging basica si no hay un manejador configurado.
 if not logging.getLogger().hasHandlers():
@@ -32,6 +33,23 @@ except ImportError as e:
     log.critical(f"Error importando desde 'tabletserver'. Asegurate que TabletInterface.py este en el directorio padre y que PYTHONPATH sea correcto. Error: {e}", exc_info=True)
     raise
 
+# Limites de la cola de envio por cliente: como maximo se agrupan este numero de mensajes
+# en un solo frame, y si un cliente lento acumula mas mensajes pendientes se descartan los
+# nuevos mensajes no esenciales (los de sistema/error y de configuracion siempre se encolan).
+MAX_MESSAGES_PER_FRAME = 128
+CLIENT_SEND_QUEUE_MAXSIZE = 1024
+# Tiempo maximo que se espera al desregistrar un cliente para que su tarea escritora envie
+# los mensajes que aun tenga en cola antes de cancelarla.
+CLIENT_FINAL_FLUSH_TIMEOUT_SEC = 1.0
+# Numero de mensajes 'gamepad_state' validos consecutivos tras los que un cliente pasa a modo
+# de confianza: sus mensajes 'gamepad_state' solo pasan la comprobacion basica de claves y tipos
+# (el resto de tipos de mensaje se validan siempre por completo).
+TRUSTED_CLIENT_THRESHOLD = 32
+# Los estados de gamepad identicos al anterior de la misma conexion se descartan, pero se sigue
+# reenviando uno cada este intervalo: MotionGamePad detiene el robot si no recibe datos en
+# GAMEPAD_DATA_TIMEOUT_SEC (0.35 s), asi que un joystick mantenido fijo no debe quedar en silencio.
+GAMEPAD_DUPLICATE_KEEPALIVE_SEC = 0.1
+
 # Gestiona el servidor web y actua como la interfaz principal para la comunicacion
 # con los clientes (UI de la tablet). Implementada como un Singleton.
 class TabletServerInterface:
@@ -65,6 +83,13 @@ class TabletServerInterface:
 
         self._active_connections: Set[Any] = set() # Conjunto de clientes WebSocket activos
         self._connections_lock = asyncio.Lock()    # Lock para gestionar el acceso concurrente a las conexiones
+        # Cada cliente tiene una cola de envio y una tarea escritora que agrupa los mensajes pendientes
+        self._client_send_queues: Dict[Any, asyncio.Queue] = {}
+        self._client_writer_tasks: Dict[Any, asyncio.Task] = {}
+        # Racha de mensajes de gamepad validos consecutivos por cliente (para el modo de confianza)
+        self._client_valid_gamepad_streak: Dict[Any, int] = {}
+        # Ultimo estado de gamepad reenviado por cliente: (clave compacta del estado, instante del reenvio)
+        self._last_gamepad_state: Dict[Any, Tuple[tuple, float]] = {}
         self._server_task: Optional[asyncio.Task] = None # Tarea asincrona donde se ejecuta el servidor
         self._running = False # Bandera para indicar si el servidor esta activo
 
@@ -81,52 +106,132 @@ class TabletServerInterface:
         self.current_app_settings: Dict[str, Any] = {
             "stt_audio_source": "robot", "ai_personality": "ume_asistente", "ai_model_backend": "openai_gpt"
         }
+        # Tabla de despacho: tipo de mensaje del cliente -> manejador. Se construye una sola vez.
+        self._client_message_handlers: Dict[str, Callable[[Dict[str, Any], Any], None]] = {
+            messages.MSG_TYPE_INPUT: self._handle_input_message,
+            messages.MSG_TYPE_CONFIG: self._handle_config_message,
+            messages.MSG_TYPE_GAMEPAD_STATE: self._handle_gamepad_state_message,
+        }
         self._initialized = True
         log.info(f"TabletServerInterface inicializada y lista para escuchar en http://{self.host}:{self.port}")
 
     # --- Metodos de Gestion de Conexiones de Clientes ---
 
-    # Registra una nueva conexion de cliente WebSocket y ejecuta el callback on_client_connected.
+    # Registra una nueva conexion de cliente WebSocket, crea su cola de envio con su tarea
+    # escritora y ejecuta el callback on_client_connected.
     async def register_client_connection(self, websocket: Any):
+        # Cola sin limite propio: CLIENT_SEND_QUEUE_MAXSIZE se aplica en queue_message_for_client
+        # solo a los mensajes no esenciales.
+        send_queue: asyncio.Queue = asyncio.Queue()
         async with self._connections_lock:
             self._active_connections.add(websocket)
+            self._client_send_queues[websocket] = send_queue
+            self._client_writer_tasks[websocket] = asyncio.create_task(self._client_writer_loop(websocket, send_queue))
         client_repr = getattr(websocket, 'client', 'Cliente Desconocido')
         log.info(f"Cliente WebSocket conectado: {client_repr}. Total de conexiones activas: {len(self._active_connections)}")
         # Notifica al orquestador que un nuevo cliente se ha conectado.
         if self.on_client_connected_callback:
             asyncio.create_task(self.on_client_connected_callback(websocket))
 
-    # Desregistra una conexion de cliente WebSocket cuando se cierra.
+    # Desregistra una conexion de cliente WebSocket cuando se cierra. Antes de terminar su tarea
+    # escritora le da hasta CLIENT_FINAL_FLUSH_TIMEOUT_SEC para enviar lo que quede en su cola.
     async def unregister_client_connection(self, websocket: Any):
         async with self._connections_lock:
             self._active_connections.discard(websocket)
+            send_queue = self._client_send_queues.pop(websocket, None)
+            writer_task = self._client_writer_tasks.pop(websocket, None)
+            self._client_valid_gamepad_streak.pop(websocket, None)
+            self._last_gamepad_state.pop(websocket, None)
+        if writer_task:
+            if send_queue is not None: send_queue.put_nowait(None) # Marca de fin: la escritora vacia la cola y termina
+            try:
+                await asyncio.wait_for(writer_task, timeout=CLIENT_FINAL_FLUSH_TIMEOUT_SEC) # Cancela la tarea si no termina a tiempo
+            except asyncio.TimeoutError:
+                log.warning(f"La tarea escritora de {getattr(websocket, 'client', 'Cliente Desconocido')} no vacio su cola a tiempo; se cancela.")
         client_repr = getattr(websocket, 'client', 'Cliente Desconocido')
         log.info(f"Cliente WebSocket desconectado: {client_repr}. Total de conexiones activas: {len(self._active_connections)}")
         # Notifica al orquestador que un cliente se ha desconectado.
         if self.on_client_disconnected_callback:
             asyncio.create_task(self.on_client_disconnected_callback(websocket))
 
+    # Indica si un cliente esta en modo de confianza (ya envio TRUSTED_CLIENT_THRESHOLD mensajes de gamepad validos seguidos).
+    def is_client_trusted(self, websocket: Any) -> bool:
+        return self._client_valid_gamepad_streak.get(websocket, 0) >= TRUSTED_CLIENT_THRESHOLD
+
+    # Registra un mensaje del cliente procesado sin errores. Solo los mensajes de gamepad (el flujo
+    # de alta frecuencia) cuentan para alcanzar el modo de confianza.
+    def record_valid_client_message(self, websocket: Any, message_type: str):
+        if message_type == messages.MSG_TYPE_GAMEPAD_STATE:
+            streak = self._client_valid_gamepad_streak.get(websocket, 0)
+            if streak < TRUSTED_CLIENT_THRESHOLD:
+                self._client_valid_gamepad_streak[websocket] = streak + 1
+                if streak + 1 == TRUSTED_CLIENT_THRESHOLD:
+                    log.info(f"Cliente {getattr(websocket, 'client', 'Cliente Desconocido')} en modo de confianza: validacion reducida de sus mensajes de gamepad.")
+
+    # Saca a un cliente del modo de confianza (y reinicia su racha) tras un mensaje invalido o un
+    # error al procesarlo, volviendo a la validacion estricta.
+    def revoke_client_trust(self, websocket: Any):
+        if self._client_valid_gamepad_streak.pop(websocket, 0) >= TRUSTED_CLIENT_THRESHOLD:
+            log.warning(f"Cliente {getattr(websocket, 'client', 'Cliente Desconocido')} sale del modo de confianza; se vuelve a la validacion estricta.")
+
     # --- Metodos para Enviar Mensajes a los Clientes (Backend -> Frontend) ---
 
-    # Metodo auxiliar interno para enviar un mensaje a todos los clientes WebSocket conectados de forma concurrente.
-    async def _broadcast_message(self, message_str: str):
+    # Tarea escritora de un cliente. Espera al primer mensaje pendiente (sin latencia anadida
+    # cuando la conexion esta inactiva) y luego toma todos los que ya esten en cola, hasta
+    # MAX_MESSAGES_PER_FRAME, enviandolos en un unico frame: un mensaje solo se envia tal cual y
+    # varios se envian como un array JSON de mensajes. Si el envio falla, el cliente se da de baja.
+    # Un None en la cola (lo encola unregister_client_connection) indica que, tras enviar los
+    # mensajes anteriores, la tarea debe terminar.
+    async def _client_writer_loop(self, websocket: Any, send_queue: asyncio.Queue):
+        try:
+            while True:
+                first_message = await send_queue.get()
+                finished = first_message is None
+                pending_messages = [] if finished else [first_message]
+                while not finished and len(pending_messages) < MAX_MESSAGES_PER_FRAME:
+                    try: next_message = send_queue.get_nowait()
+                    except asyncio.QueueEmpty: break
+                    if next_message is None: finished = True
+                    else: pending_messages.append(next_message)
+                if len(pending_messages) == 1: await websocket.send_bytes(pending_messages[0])
+                elif pending_messages: await websocket.send_bytes(b"[" + b",".join(pending_messages) + b"]") # Los mensajes ya son JSON, no se re-serializan
+                if finished: return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            client_repr = getattr(websocket, 'client', 'Cliente Desconocido')
+            async with self._connections_lock:
+                self._active_connections.discard(websocket)
+                self._client_send_queues.pop(websocket, None)
+                self._client_writer_tasks.pop(websocket, None)
+            log.info(f"Cliente {client_repr} eliminado por error de envio ({e}). Total activos ahora: {len(self._active_connections)}")
+
+    # Encola un mensaje ya serializado (JSON en bytes UTF-8) para un cliente concreto. No espera al envio real, que
+    # lo hace la tarea escritora del cliente. Si su cola ya tiene CLIENT_SEND_QUEUE_MAXSIZE mensajes (cliente
+    # demasiado lento), un mensaje no esencial se descarta con un aviso; los esenciales se encolan siempre.
+    #
+    # Args:
+    #   websocket: El cliente destino.
+    #   message_bytes (bytes): El mensaje JSON ya serializado.
+    #   essential (bool): True para mensajes que no deben perderse (sistema/error, configuracion).
+    def queue_message_for_client(self, websocket: Any, message_bytes: bytes, essential: bool = False):
+        send_queue = self._client_send_queues.get(websocket)
+        if send_queue is None: return
+        if not essential and send_queue.qsize() >= CLIENT_SEND_QUEUE_MAXSIZE:
+            log.warning(f"Cola de envio llena para {getattr(websocket, 'client', 'Cliente Desconocido')}. Mensaje descartado.")
+            return
+        send_queue.put_nowait(message_bytes)
+
+    # Metodo auxiliar interno para enviar un mensaje a todos los clientes WebSocket conectados.
+    # Solo encola el mensaje en la cola de cada cliente; las tareas escritoras hacen los envios.
+    async def _broadcast_message(self, message_bytes: bytes, essential: bool = False):
         if not self._active_connections: return
 
         async with self._connections_lock:
             current_connections = list(self._active_connections) # Crea una copia para evitar problemas de concurrencia
 
-        if not current_connections: return
-
-        # Envia el mensaje a todos los clientes simultaneamente y maneja excepciones
-        results = await asyncio.gather(*(ws.send_text(message_str) for ws in current_connections), return_exceptions=True)
-
-        # Limpia las conexiones que fallaron durante el envio
-        disconnected_during_send = [current_connections[i] for i, result in enumerate(results) if isinstance(result, Exception)]
-        if disconnected_during_send:
-            async with self._connections_lock:
-                for ws_to_remove in disconnected_during_send:
-                    self._active_connections.discard(ws_to_remove)
-            log.info(f"Clientes eliminados por error en broadcast: {len(disconnected_during_send)}. Total activos ahora: {len(self._active_connections)}")
+        for ws in current_connections:
+            self.queue_message_for_client(ws, message_bytes, essential)
 
     # Construye y envia un mensaje de tipo 'input' a todos los clientes.
     async def send_active_input_display(self, text: str, source: Literal["gui_manual", "stt_auto"]):
@@ -140,7 +245,7 @@ class TabletServerInterface:
 
     # Construye y envia un mensaje de tipo 'system' a todos los clientes.
     async def send_system_message(self, sender_name: str, level: Literal["info", "warning", "error"], text: str, detail: Optional[Dict] = None):
-        await self._broadcast_message(messages.craft_system_message(sender_name, level, text, detail))
+        await self._broadcast_message(messages.craft_system_message(sender_name, level, text, detail), essential=True)
         log.info(f"Enviado 'system_message' a clientes: (Nivel: {level}, Texto: '{text[:30]}...')")
 
     # Envia la configuracion actual a un cliente especifico (usualmente, al que acaba de conectar).
@@ -148,48 +253,84 @@ class TabletServerInterface:
         client_repr = getattr(websocket, 'client', 'Cliente Desconocido')
         log.debug(f"Enviando configuracion {config_settings} al cliente especifico {client_repr}")
         try:
-            await websocket.send_text(messages.craft_current_configuration_message(config_settings))
+            self.queue_message_for_client(websocket, messages.craft_current_configuration_message(config_settings), essential=True)
             log.info(f"Configuracion actual del sistema enviada al cliente {client_repr}.")
         except Exception as e:
             log.error(f"Error enviando la configuracion actual al cliente {client_repr}: {e}", exc_info=True)
 
     # Construye y envia una confirmacion de cambio de configuracion a todos los clientes.
     async def send_config_confirmation(self, config_item: str, success: bool, current_value: Any, message_to_display: str):
-        await self._broadcast_message(messages.craft_config_confirmation_message(config_item, success, current_value, message_to_display))
+        await self._broadcast_message(messages.craft_config_confirmation_message(config_item, success, current_value, message_to_display), essential=True)
         log.info(f"Enviado 'config_confirmation': (Item: {config_item}, Exito: {success}, ValorActual: {current_value})")
 
     # Construye y envia un resultado parcial o final de STT a todos los clientes.
     async def send_partial_stt_result(self, partial_text: str, is_final: bool):
         await self._broadcast_message(messages.craft_partial_stt_result_message(partial_text, is_final))
-        log.debug(f"Enviado 'partial_stt_result' a clientes: (Texto: '{partial_text[:30]}...', EsFinal: {is_final})")
+        log.debug("Enviado 'partial_stt_result' a clientes: (Texto: '%.30s...', EsFinal: %s)", partial_text, is_final)
 
     # --- Metodo para Manejar Mensajes Entrantes (Frontend -> Backend) ---
 
     # Metodo central para manejar los mensajes entrantes de los clientes.
-    # Actua como un despachador (dispatcher): segun el tipo de mensaje,
-    # invoca el callback correspondiente que fue configurado por el orquestador principal.
+    # Actua como un despachador (dispatcher): segun el tipo de mensaje, busca su manejador en la
+    # tabla de despacho, que invoca el callback configurado por el orquestador principal.
     async def handle_client_message(self, message_type: str, payload: Dict[str, Any], websocket: Any):
         client_repr = getattr(websocket, 'client', 'Cliente Desconocido')
-        log.info(f"Recibido de {client_repr}: Tipo='{message_type}', Payload='{str(payload)[:100]}...'")
-
-        if message_type == messages.MSG_TYPE_INPUT:
-            if self.on_input_received: asyncio.create_task(self.on_input_received(payload))
-            else: log.warning("Callback 'on_input_received' no esta configurado en TabletInterface.")
-        elif message_type == messages.MSG_TYPE_CONFIG:
-            if self.on_config_received: asyncio.create_task(self.on_config_received(payload))
-            else: log.warning("Callback 'on_config_received' no esta configurado en TabletInterface.")
-        elif message_type == messages.MSG_TYPE_GAMEPAD_STATE:
-            # Prioridad 1: Parada de Emergencia
-            stick_buttons = payload.get("stick_button_states", {})
-            if stick_buttons.get("l3_pressed", False) or stick_buttons.get("r3_pressed", False):
-                log.warning(f"¡PARADA DE EMERGENCIA (L3/R3) solicitada por el cliente {client_repr}!")
-                if self.on_gamepad_emergency_stop: asyncio.create_task(self.on_gamepad_emergency_stop())
-                else: log.error("Callback 'on_gamepad_emergency_stop' no configurado. ¡NO SE PUEDE EJECUTAR EL E-STOP!")
-            else: # Si no es E-STOP, pasa el payload completo al manejador de gamepad
-                if self.on_gamepad_payload_received: asyncio.create_task(self.on_gamepad_payload_received(payload))
-                else: log.warning("Callback 'on_gamepad_payload_received' no configurado. Los datos del gamepad seran ignorados.")
-        else:
+        # Se llama una vez por mensaje (gamepad a 30-60 Hz): formato perezoso, y el recorte del payload solo si el nivel esta activo.
+        if log.isEnabledFor(logging.INFO): log.info("Recibido de %s: Tipo='%s', Payload='%.100s...'", client_repr, message_type, payload)
+
+        handler = self._client_message_handlers.get(message_type)
+        if handler is None:
             log.warning(f"Tipo de mensaje '{message_type}' desconocido o no manejable recibido de {client_repr}.")
+            return
+        handler(payload, websocket)
+
+    # Manejador de mensajes 'input': pasa el payload al callback de entrada.
+    def _handle_input_message(self, payload: Dict[str, Any], websocket: Any):
+        if self.on_input_received: asyncio.create_task(self.on_input_received(payload))
+        else: log.warning("Callback 'on_input_received' no esta configurado en TabletInterface.")
+
+    # Manejador de mensajes 'config': pasa el payload al callback de configuracion.
+    def _handle_config_message(self, payload: Dict[str, Any], websocket: Any):
+        if self.on_config_received: asyncio.create_task(self.on_config_received(payload))
+        else: log.warning("Callback 'on_config_received' no esta configurado en TabletInterface.")
+
+    # Manejador de mensajes 'gamepad_state'. La parada de emergencia (L3/R3) tiene prioridad;
+    # en otro caso se pasa el payload completo al manejador de gamepad.
+    def _handle_gamepad_state_message(self, payload: Dict[str, Any], websocket: Any):
+        stick_buttons = payload.get("stick_button_states", {})
+        if stick_buttons.get("l3_pressed", False) or stick_buttons.get("r3_pressed", False):
+            log.warning(f"¡PARADA DE EMERGENCIA (L3/R3) solicitada por el cliente {getattr(websocket, 'client', 'Cliente Desconocido')}!")
+            if self.on_gamepad_emergency_stop: asyncio.create_task(self.on_gamepad_emergency_stop())
+            else: log.error("Callback 'on_gamepad_emergency_stop' no configurado. ¡NO SE PUEDE EJECUTAR EL E-STOP!")
+        else:
+            if self._is_duplicate_gamepad_state(payload, websocket): return
+            if self.on_gamepad_payload_received: asyncio.create_task(self.on_gamepad_payload_received(payload))
+            else: log.warning("Callback 'on_gamepad_payload_received' no configurado. Los datos del gamepad seran ignorados.")
+
+    # Indica si un estado de gamepad repite el ultimo reenviado para esa conexion y puede descartarse.
+    # El estado se reduce a una clave compacta: los ejes de ambos joysticks y todos los botones
+    # empaquetados como bits en un entero. Un duplicado solo se descarta si el ultimo reenvio fue hace
+    # menos de GAMEPAD_DUPLICATE_KEEPALIVE_SEC; si no, se reenvia para mantener vivo el "hombre muerto".
+    # Si algun grupo no es un diccionario (ej. 'bumper_states', que no se valida), el estado no se
+    # compara y se trata como no duplicado: se reenvia tal cual, como antes del filtrado.
+    def _is_duplicate_gamepad_state(self, payload: Dict[str, Any], websocket: Any) -> bool:
+        left_stick = payload.get("left_stick") or {}
+        right_stick = payload.get("right_stick") or {}
+        if not isinstance(left_stick, dict) or not isinstance(right_stick, dict): return False
+        button_bits = 0
+        for group in ("dpad_events", "action_button_events", "stick_button_states", "bumper_states"):
+            group_value = payload.get(group) or {}
+            if not isinstance(group_value, dict): return False
+            for pressed in group_value.values():
+                button_bits = (button_bits << 1) | (pressed is True)
+        state_key = (left_stick.get("x"), left_stick.get("y"), right_stick.get("x"), right_stick.get("y"), button_bits)
+
+        now = time.monotonic()
+        previous = self._last_gamepad_state.get(websocket)
+        if previous is not None and previous[0] == state_key and now - previous[1] < GAMEPAD_DUPLICATE_KEEPALIVE_SEC:
+            return True
+        self._last_gamepad_state[websocket] = (state_key, now)
+        return False
 
     # --- Metodos de Ciclo de Vida del Servidor ---
 
@@ -201,7 +342,8 @@ class TabletServerInterface:
         if uvicorn_log_level in ["notset", "debug"]: uvicorn_log_level_actual_for_uvicorn = "info"
         else: uvicorn_log_level_actual_for_uvicorn = uvicorn_log_level
         # Crea la configuracion para el servidor Uvicorn
-        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level=uvicorn_log_level_actual_for_uvicorn)
+        # ws_max_size: los frames WebSocket mayores que WS_MAX_FRAME_BYTES (algo por encima del limite de mensaje de Endpoints) se rechazan a nivel de protocolo.
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level=uvicorn_log_level_actual_for_uvicorn, ws_max_size=messages.WS_MAX_FRAME_BYTES)
         # Guarda la instancia del servidor para poder llamarle should_exit mas tarde
         self.server_instance_uvicorn = uvicorn.Server(config)
         log.info(f"Iniciando servidor Uvicorn para TabletInterface en http://{self.host}:{self.port} (Log Uvicorn: '{uvicorn_log_level_actual_for_uvicorn}')...")
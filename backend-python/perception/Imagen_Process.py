@@ -17,6 +17,9 @@
 
 import rclpy
 from rclpy.node import Node
+from rclpy.executors import MultiThreadedExecutor
+from rclpy.qos import QoSProfile, HistoryPolicy, ReliabilityPolicy, DurabilityPolicy
+from rclpy.time import Time
 from sensor_msgs.msg import Image # Tipo de mensaje estandar en ROS2 para imagenes
 from std_msgs.msg import Bool   # Tipo de mensaje estandar para valores booleanos (True/False)
 from cv_bridge import CvBridge, CvBridgeError # Herramienta para convertir entre imagenes de ROS2 y OpenCV
@@ -25,11 +28,42 @@ import numpy as np
 import threading
 import time
 import os
+import collections
+import hashlib
+import shutil
+import torch # Backend de Ultralytics; se usa directamente para entregar lotes ya preprocesados en GPU
 from ultralytics import YOLO # Libreria para utilizar modelos YOLO
 
+# TensorRT es opcional: si no esta instalado se usa el modelo PyTorch (.pt) directamente.
+try:
+    import tensorrt # noqa: F401 (solo se comprueba su disponibilidad, Ultralytics lo usa internamente)
+except ImportError:
+    tensorrt = None
+
+# El preprocesado en GPU requiere OpenCV compilado con CUDA (el paquete 'opencv-python' de pip no lo incluye).
+try:
+    CV2_CUDA_AVAILABLE = cv2.cuda.getCudaEnabledDeviceCount() > 0 and torch.cuda.is_available()
+except Exception:
+    CV2_CUDA_AVAILABLE = False
+
+# Adaptador que expone un cv2.cuda_GpuMat float32 de 3 canales mediante el protocolo
+# __cuda_array_interface__, para que torch.as_tensor lo envuelva sin copiarlo al host.
+class _GpuMatCudaView:
+    def __init__(self, gpu_mat):
+        cols, rows = gpu_mat.size()
+        self.__cuda_array_interface__ = {
+            'shape': (rows, cols, 3),
+            'strides': (gpu_mat.step, 3 * 4, 4),
+            'typestr': '<f4',
+            'data': (gpu_mat.cudaPtr(), False),
+            'version': 3,
+        }
+
 # --- Dependencias Requeridas ---
 # Asegurate de tener estas librerias en tu entorno de ROS2:
 # pip install ultralytics opencv-python
+# Opcional (GPU NVIDIA): tensorrt, para exportar y ejecutar el modelo como motor .engine FP16/INT8.
+# Opcional (GPU NVIDIA): OpenCV >= 4.8 compilado con CUDA, para el preprocesado de imagenes en GPU.
 
 # Nodo de ROS2 que se suscribe a un stream de imagenes, detecta personas
 # utilizando un modelo YOLO, y publica el estado de la deteccion en otros topics.
@@ -45,17 +79,33 @@ class PersonDetectorNode(Node):
         self.declare_parameter('camera_topic', '/camera/front/image_raw') # Topic de la camara a la que suscribirse
         self.declare_parameter('yolo_model_name', 'yolov8n.pt') # Modelo YOLOv8 nano, ligero y rapido.
         self.declare_parameter('confidence_threshold', 0.45) # Umbral de confianza para las detecciones
+        self.declare_parameter('inference_imgsz', 320) # Tamano de entrada del modelo (320 = ~4x menos FLOPs que 640; fijo si se exporta a TensorRT)
+        self.declare_parameter('inference_batch_size', 4) # Maximo de frames por inferencia (4 minimiza energia/frame, 8 para GPUs grandes)
+        self.declare_parameter('max_frame_age_sec', 0.1) # Frames mas antiguos que esto se descartan sin inferir (0 = desactivado)
+        self.declare_parameter('use_tensorrt', True) # Exportar y usar un motor TensorRT si hay GPU y tensorrt disponible
+        self.declare_parameter('tensorrt_precision', 'fp16') # 'fp16' o 'int8' (INT8 requiere datos de calibracion)
+        self.declare_parameter('tensorrt_int8_calibration_data', '') # YAML de dataset con frames representativos de la camara
+        self.declare_parameter('gpu_preprocessing', True) # Redimensionar/normalizar en GPU con OpenCV-CUDA si esta disponible
+        self.declare_parameter('status_heartbeat_sec', 1.0) # Reenvio periodico del estado aunque no cambie
 
         # Obtener los valores de los parametros
         self.camera_topic = self.get_parameter('camera_topic').get_parameter_value().string_value
         yolo_model_name = self.get_parameter('yolo_model_name').get_parameter_value().string_value
         self.confidence_threshold = self.get_parameter('confidence_threshold').get_parameter_value().double_value
+        self.inference_imgsz = self.get_parameter('inference_imgsz').get_parameter_value().integer_value
+        self.inference_batch_size = max(1, self.get_parameter('inference_batch_size').get_parameter_value().integer_value)
+        self._max_frame_age_ns = int(self.get_parameter('max_frame_age_sec').get_parameter_value().double_value * 1e9)
+        use_tensorrt = self.get_parameter('use_tensorrt').get_parameter_value().bool_value
+        tensorrt_precision = self.get_parameter('tensorrt_precision').get_parameter_value().string_value.lower()
+        tensorrt_calib_data = self.get_parameter('tensorrt_int8_calibration_data').get_parameter_value().string_value
+        self._gpu_preprocessing = self.get_parameter('gpu_preprocessing').get_parameter_value().bool_value and CV2_CUDA_AVAILABLE
+        self._status_heartbeat_sec = self.get_parameter('status_heartbeat_sec').get_parameter_value().double_value
 
         self.get_logger().info(f"Suscribiendose al topic de camara: '{self.camera_topic}'")
         self.get_logger().info(f"Usando modelo YOLO: '{yolo_model_name}' (Umbral de confianza: {self.confidence_threshold})")
         # --- Fin de Parametros ---
 
-        self.bridge = CvBridge() # Instancia para la conversion de imagenes
+        self.bridge = CvBridge() # Conversion de imagenes para codificaciones sin ruta directa (ver _image_msg_to_array)
 
         # --- Seccion de Carga del Modelo YOLO ---
         self.yolo_model = None
@@ -63,7 +113,24 @@ class PersonDetectorNode(Node):
         self.yolo_model_loaded = False
         try:
             self.get_logger().info(f"Cargando modelo YOLO '{yolo_model_name}'... (Puede tardar la primera vez)")
-            self.yolo_model = YOLO(yolo_model_name)
+            engine_path = None
+            if use_tensorrt:
+                engine_path = self._resolve_tensorrt_engine(yolo_model_name, self.inference_imgsz, self.inference_batch_size, tensorrt_precision, tensorrt_calib_data)
+            if engine_path:
+                # Un .engine en cache puede no cargar (otra version de TensorRT u otra GPU, archivo
+                # a medio escribir): el fallo aparece al cargarlo o en la primera inferencia, asi que
+                # ambas van en su propio bloque y se vuelve al modelo .pt en lugar de detener el nodo.
+                # Un motor TensorRT necesita varias pasadas para fijar sus kernels.
+                try:
+                    self.yolo_model = YOLO(engine_path, task='detect')
+                    self._warmup_yolo_model(repetitions=3)
+                    self.get_logger().info(f"Usando motor TensorRT '{engine_path}' ({tensorrt_precision.upper()}, imgsz={self.inference_imgsz}).")
+                except Exception as e_engine:
+                    self.get_logger().warn(f"No se pudo usar el motor TensorRT '{engine_path}', se usara el modelo .pt: {e_engine}")
+                    self.yolo_model = None
+            if self.yolo_model is None:
+                self.yolo_model = YOLO(yolo_model_name) # Fallback: modelo PyTorch original
+                self._warmup_yolo_model(repetitions=1)
             # Encuentra el ID de la clase 'person' en el modelo cargado
             if hasattr(self.yolo_model, 'names'):
                 # YOLOv8 guarda los nombres en model.names (un diccionario id -> nombre)
@@ -87,28 +154,152 @@ class PersonDetectorNode(Node):
             raise e # Lanza la excepcion para detener la inicializacion del nodo.
         # --- Fin Carga Modelo YOLO ---
 
+        # --- Seccion de Buffers de Preprocesado en GPU ---
+        # Se reservan una sola vez: el frame subido, sus versiones redimensionada, RGB y float,
+        # y el tensor de lote (B, 3, imgsz, imgsz) que se entrega a YOLO. Asi no hay reservas por frame.
+        # Hay dos juegos de buffers ("slots"), cada uno con su propio stream CUDA, que se alternan
+        # frame a frame: la subida asincrona de un frame se solapa con el preprocesado del anterior.
+        # El buffer de host de cada slot es memoria fijada (page-locked), requisito para que la
+        # subida sea realmente asincrona; se reserva con el primer frame, cuando se conoce su tamano.
+        # Se reserva con PyTorch (pin_memory=True) y se usa como array numpy sobre esa misma memoria:
+        # cv2.cuda.HostMem.createMatHeader() no sirve, porque los bindings de Python copian el Mat
+        # a un array numpy nuevo en memoria paginable.
+        if self._gpu_preprocessing:
+            size = (self.inference_imgsz, self.inference_imgsz)
+            self._gpu_slots = []
+            for _ in range(2):
+                cv_stream = cv2.cuda.Stream()
+                self._gpu_slots.append({
+                    'cv_stream': cv_stream,
+                    'torch_stream': torch.cuda.ExternalStream(cv_stream.cudaPtr()), # Mismo stream visto desde PyTorch
+                    'pinned': None, # torch.Tensor uint8 fijado, reservado en _preprocess_batch_on_gpu
+                    'pinned_view': None, # Array numpy sobre la memoria de 'pinned' (sin copia)
+                    'frame': cv2.cuda_GpuMat(),
+                    'resized': cv2.cuda_GpuMat(size[1], size[0], cv2.CV_8UC3),
+                    'rgb': cv2.cuda_GpuMat(size[1], size[0], cv2.CV_8UC3),
+                    'float': cv2.cuda_GpuMat(size[1], size[0], cv2.CV_32FC3),
+                })
+            self._gpu_batch = torch.empty((self.inference_batch_size, 3, size[1], size[0]), dtype=torch.float32, device='cuda')
+            self.get_logger().info("Preprocesado en GPU (OpenCV-CUDA, subida asincrona con memoria fijada) activado.")
+        # --- Fin Buffers GPU ---
+
         # --- Seccion de Publishers ---
         # Publisher para el estado de deteccion: publica True/False si se detecta una persona.
-        self.status_publisher_ = self.create_publisher(Bool, 'person_detected_status', 10)
+        # Solo se publica cuando el estado cambia (o como latido cada status_heartbeat_sec), por eso
+        # usa TRANSIENT_LOCAL: un suscriptor que se conecte tarde recibe igualmente el ultimo estado.
+        status_qos = QoSProfile(history=HistoryPolicy.KEEP_LAST, depth=1, durability=DurabilityPolicy.TRANSIENT_LOCAL)
+        self.status_publisher_ = self.create_publisher(Bool, 'person_detected_status', status_qos)
+        self._status_msg = Bool() # Mensaje reutilizado en cada publicacion del estado
+        self._last_status = None # Ultimo estado publicado
+        self._last_status_pub_time = 0.0 # Momento (monotonic) de la ultima publicacion del estado
         # Publisher para la imagen: publica la imagen COMPLETA solo cuando se detecta una persona.
         # Esto es eficiente para no sobrecargar la red con imagenes innecesarias.
-        self.image_publisher_ = self.create_publisher(Image, 'person_detected_image', 5) # QoS 5 es suficiente para esto.
+        # BEST_EFFORT: el topic de estado ya lleva la informacion fiable, perder una imagen no es critico.
+        image_qos = QoSProfile(history=HistoryPolicy.KEEP_LAST, depth=5, reliability=ReliabilityPolicy.BEST_EFFORT)
+        self.image_publisher_ = self.create_publisher(Image, 'person_detected_image', image_qos)
+        # rclpy no expone mensajes prestados (zero-copy loans) en los publishers: eso solo existe en
+        # rclcpp. La imagen se publica tal cual y la unica mejora aqui es el QoS BEST_EFFORT.
         # --- Fin Publishers ---
 
+        # --- Seccion de Procesamiento por Lotes ---
+        # El callback solo encola los frames; un hilo dedicado ejecuta la inferencia sobre
+        # todos los frames acumulados (hasta inference_batch_size) en una sola llamada a YOLO.
+        # El buffer es circular: si la inferencia va mas lenta que la camara, se descartan los mas antiguos.
+        self._frame_queue = collections.deque(maxlen=self.inference_batch_size)
+        self._frame_condition = threading.Condition()
+        self._inference_worker_running = True
+        self._inference_thread = threading.Thread(target=self._inference_worker_loop, name="YoloBatchWorker", daemon=True)
+        self._inference_thread.start()
+        # --- Fin Procesamiento por Lotes ---
+
         # --- Seccion de Suscriptor ---
         # Suscriptor al topic de la camara. Cada vez que llega una imagen, se llama a image_callback_and_process.
+        # QoS 'solo el ultimo frame' (KEEP_LAST 1, BEST_EFFORT): si YOLO va mas lento que la camara,
+        # el middleware descarta los frames viejos en lugar de acumularlos y aumentar la latencia.
+        camera_qos = QoSProfile(history=HistoryPolicy.KEEP_LAST, depth=1, reliability=ReliabilityPolicy.BEST_EFFORT)
         self.image_subscription = self.create_subscription(
             Image,
             self.camera_topic,
             self.image_callback_and_process, # Funcion a ejecutar por cada mensaje
-            10) # Quality of Service (QoS) depth
+            qos_profile=camera_qos)
 
         self.get_logger().info("Nodo listo para recibir y procesar imagenes.")
 
+    # Ejecuta inferencias sincronas sobre un frame negro para pagar en el arranque los costes
+    # unicos (contexto CUDA, autotune de cuDNN, seleccion de kernels de TensorRT) en lugar de
+    # hacerlo con el primer frame real, lo que provocaria una rafaga de frames descartados.
+    #
+    # Args:
+    #   repetitions (int): Numero de inferencias de calentamiento.
+    def _warmup_yolo_model(self, repetitions=1):
+        dummy_frame = np.zeros((480, 640, 3), dtype=np.uint8) # Resolucion tipica de la camara de Pepper
+        start_time = time.monotonic()
+        for _ in range(repetitions):
+            self.yolo_model(dummy_frame, imgsz=self.inference_imgsz, verbose=False)
+        elapsed_ms = (time.monotonic() - start_time) * 1000
+        self.get_logger().info(f"Calentamiento del modelo YOLO completado ({repetitions} inferencias, {elapsed_ms:.0f} ms).")
+
+    # Obtiene la ruta de un motor TensorRT (.engine) para el modelo indicado, exportandolo
+    # una sola vez si no existe. El motor se guarda junto al modelo con un nombre que
+    # incluye el tamano de entrada, el lote, la precision, la version de TensorRT, la GPU y (en INT8)
+    # el dataset de calibracion, ya que un .engine queda fijado a todos ellos: si cambia cualquiera,
+    # el nombre cambia y se exporta un motor nuevo en lugar de reutilizar uno obsoleto.
+    #
+    # Args:
+    #   model_name (str): Nombre o ruta del modelo YOLO (.pt).
+    #   imgsz (int): Tamano de entrada con el que se exporta el motor.
+    #   batch (int): Tamano de lote maximo del motor (se exporta con lote dinamico 1..batch).
+    #   precision (str): 'fp16' o 'int8'.
+    #   calib_data (str): Ruta al YAML de calibracion (solo para INT8).
+    #
+    # Returns:
+    #   str | None: Ruta al motor listo para cargar, o None si TensorRT no esta disponible
+    #               o la exportacion falla (en ese caso se usa el modelo .pt).
+    def _resolve_tensorrt_engine(self, model_name, imgsz, batch, precision, calib_data):
+        if tensorrt is None:
+            self.get_logger().info("TensorRT no esta instalado. Se usara el modelo PyTorch (.pt).")
+            return None
+        if precision not in ('fp16', 'int8'):
+            self.get_logger().warn(f"Precision TensorRT '{precision}' no soportada. Usando 'fp16'.")
+            precision = 'fp16'
+        if precision == 'int8' and not calib_data:
+            self.get_logger().warn("INT8 requiere 'tensorrt_int8_calibration_data'. Usando 'fp16'.")
+            precision = 'fp16'
+
+        base_path, _ = os.path.splitext(model_name)
+        cache_tag = f"trt{getattr(tensorrt, '__version__', 'unknown')}"
+        try:
+            major, minor = torch.cuda.get_device_capability()
+            cache_tag += f"_sm{major}{minor}"
+        except Exception:
+            pass
+        if precision == 'int8':
+            # Ruta absoluta y fecha de modificacion del YAML: recalibra si se cambia o se edita el dataset
+            calib_abspath = os.path.abspath(calib_data)
+            calib_mtime = os.path.getmtime(calib_abspath) if os.path.exists(calib_abspath) else 0
+            cache_tag += "_cal" + hashlib.sha1(f"{calib_abspath}:{calib_mtime}".encode()).hexdigest()[:8]
+        engine_path = f"{base_path}_{imgsz}_b{batch}_{precision}_{cache_tag}.engine"
+        if os.path.isfile(engine_path):
+            self.get_logger().info(f"Motor TensorRT en cache encontrado: '{engine_path}'.")
+            return engine_path
+
+        try:
+            self.get_logger().info(f"Exportando '{model_name}' a TensorRT ({precision.upper()}, imgsz={imgsz})... (Solo la primera vez, puede tardar minutos)")
+            export_kwargs = {'format': 'engine', 'imgsz': imgsz, 'batch': batch, 'dynamic': batch > 1, 'device': 0}
+            if precision == 'int8':
+                export_kwargs.update(int8=True, data=calib_data)
+            else:
+                export_kwargs['half'] = True
+            exported_path = YOLO(model_name).export(**export_kwargs)
+            shutil.move(str(exported_path), engine_path) # Renombra al nombre con la clave completa del motor
+            return engine_path
+        except Exception as e:
+            self.get_logger().warn(f"No se pudo exportar el modelo a TensorRT, se usara el modelo .pt: {e}")
+            return None
+
     # Funcion callback que se ejecuta por cada mensaje de imagen recibido.
-    # Convierte el mensaje de imagen ROS a un formato de OpenCV, ejecuta la
-    # inferencia del modelo YOLO para buscar personas y publica los resultados
-    # en los topics correspondientes.
+    # No ejecuta la inferencia directamente: encola el mensaje en el buffer circular
+    # y despierta al hilo de inferencia, para que el executor de ROS2 nunca se bloquee.
     #
     # Args:
     #   msg (sensor_msgs.msg.Image): El mensaje de imagen recibido del topic de la camara.
@@ -116,42 +307,173 @@ class PersonDetectorNode(Node):
         # No procesar si el modelo no esta cargado o no se encontro la clase 'person'.
         if not self.yolo_model_loaded or self.person_class_id is None:
             # Publica False si no podemos detectar.
-            status_msg = Bool(); status_msg.data = False
-            self.status_publisher_.publish(status_msg)
+            self._publish_status(False)
             return
 
-        try:
-            # Convierte el mensaje de imagen de ROS2 a una imagen de OpenCV (formato BGR8)
-            cv_image = self.bridge.imgmsg_to_cv2(msg, desired_encoding='bgr8')
-        except CvBridgeError as e:
-            self.get_logger().error(f'Error de CvBridge al convertir la imagen: {e}')
+        if self._is_frame_stale(msg):
+            return
+
+        with self._frame_condition:
+            self._frame_queue.append(msg)
+            self._frame_condition.notify()
+
+    # Comprueba si un frame es demasiado antiguo para que valga la pena procesarlo,
+    # comparando su marca de tiempo con el reloj del nodo. Los frames sin marca de
+    # tiempo (stamp en cero) nunca se consideran antiguos.
+    #
+    # Args:
+    #   msg (sensor_msgs.msg.Image): El mensaje de imagen a comprobar.
+    #
+    # Returns:
+    #   bool: True si el frame supera max_frame_age_sec y debe descartarse.
+    def _is_frame_stale(self, msg: Image) -> bool:
+        if self._max_frame_age_ns <= 0:
+            return False
+        stamp_ns = Time.from_msg(msg.header.stamp).nanoseconds
+        if stamp_ns == 0:
+            return False
+        age_ns = self.get_clock().now().nanoseconds - stamp_ns
+        if age_ns > self._max_frame_age_ns:
+            # Aviso visible (limitado a uno cada 5 s): si el reloj de la camara no coincide con el del
+            # nodo (sim time, robot sin sincronizar) todos los frames se descartan y la deteccion muere.
+            self.get_logger().warn(
+                f"Frame descartado por antiguedad ({age_ns / 1e6:.0f} ms > {self._max_frame_age_ns / 1e6:.0f} ms). "
+                "Si todos los frames se descartan, revisa la sincronizacion de relojes o desactiva la comprobacion "
+                "con max_frame_age_sec:=0.0.",
+                throttle_duration_sec=5)
+            return True
+        return False
+
+    # Bucle del hilo de inferencia. Espera a que haya frames en el buffer, toma todos los
+    # disponibles (como maximo inference_batch_size) y los procesa en un unico lote.
+    # Si el hilo esta libre cuando llega un frame se procesa de inmediato (lote de 1);
+    # los lotes grandes solo se forman cuando la inferencia va por detras de la camara.
+    def _inference_worker_loop(self):
+        while True:
+            with self._frame_condition:
+                while self._inference_worker_running and not self._frame_queue:
+                    self._frame_condition.wait()
+                if not self._inference_worker_running:
+                    return
+                batch_msgs = list(self._frame_queue)
+                self._frame_queue.clear()
+            # Vuelve a comprobar la antiguedad: los frames pueden haber envejecido en el buffer
+            # mientras se procesaba el lote anterior.
+            batch_msgs = [msg for msg in batch_msgs if not self._is_frame_stale(msg)]
+            if batch_msgs:
+                self._process_batch(batch_msgs)
+
+    # Obtiene la imagen de un mensaje ROS2 como array HxWx3 en orden BGR sin copiar los pixeles:
+    # para 'bgr8' y 'rgb8' se crea una vista numpy directamente sobre msg.data (el cambio
+    # RGB->BGR tambien es una vista). Otras codificaciones se convierten con CvBridge.
+    #
+    # Args:
+    #   msg (sensor_msgs.msg.Image): El mensaje de imagen recibido de la camara.
+    #
+    # Returns:
+    #   np.ndarray: La imagen en formato BGR (solo lectura si es una vista).
+    #
+    # Raises:
+    #   CvBridgeError: Si CvBridge no puede convertir una codificacion no soportada directamente.
+    def _image_msg_to_array(self, msg: Image) -> np.ndarray:
+        if msg.encoding not in ('bgr8', 'rgb8'):
+            return self.bridge.imgmsg_to_cv2(msg, desired_encoding='bgr8')
+        # 'step' puede incluir relleno al final de cada fila, por eso se recorta a width*3.
+        rows = np.frombuffer(msg.data, dtype=np.uint8).reshape(msg.height, msg.step)
+        image = rows[:, :msg.width * 3].reshape(msg.height, msg.width, 3)
+        if msg.encoding == 'rgb8':
+            image = image[..., ::-1]
+        return image
+
+    # Preprocesa un lote de imagenes BGR completamente en GPU (subida, redimensionado,
+    # BGR->RGB, normalizacion a [0, 1] y HWC->CHW) sobre los buffers reservados en __init__.
+    # Todas las operaciones de un frame se encolan de forma asincrona en el stream de su slot;
+    # la CPU solo espera a un slot antes de reescribir su buffer de host fijado.
+    # El tensor resultante se pasa a YOLO, que lo usa tal cual sin su preprocesado en CPU.
+    # Nota: se redimensiona a imgsz x imgsz sin letterbox; basta para saber si hay una persona.
+    #
+    # Args:
+    #   cv_images (list[np.ndarray]): Imagenes BGR del lote (como maximo inference_batch_size).
+    #
+    # Returns:
+    #   torch.Tensor: Vista (N, 3, imgsz, imgsz) float32 sobre el buffer de lote en GPU.
+    def _preprocess_batch_on_gpu(self, cv_images):
+        size = (self.inference_imgsz, self.inference_imgsz)
+        for i, cv_image in enumerate(cv_images):
+            slot = self._gpu_slots[i % len(self._gpu_slots)]
+            cv_stream = slot['cv_stream']
+            cv_stream.waitForCompletion() # El buffer fijado de este slot puede seguir subiendose
+            if slot['pinned_view'] is None or slot['pinned_view'].shape != cv_image.shape:
+                # La referencia al tensor mantiene viva (y fijada) la memoria que ve el array numpy
+                slot['pinned'] = torch.empty(cv_image.shape, dtype=torch.uint8, pin_memory=True)
+                slot['pinned_view'] = slot['pinned'].numpy()
+            np.copyto(slot['pinned_view'], cv_image) # Unica copia en CPU; tambien resuelve vistas rgb8/relleno
+            slot['frame'].upload(slot['pinned_view'], cv_stream)
+            cv2.cuda.resize(slot['frame'], size, dst=slot['resized'], stream=cv_stream)
+            cv2.cuda.cvtColor(slot['resized'], cv2.COLOR_BGR2RGB, dst=slot['rgb'], stream=cv_stream)
+            slot['rgb'].convertTo(cv2.CV_32FC3, alpha=1.0 / 255.0, beta=0.0, stream=cv_stream, dst=slot['float'])
+            with torch.cuda.stream(slot['torch_stream']):
+                hwc = torch.as_tensor(_GpuMatCudaView(slot['float']), device='cuda')
+                self._gpu_batch[i].copy_(hwc.permute(2, 0, 1), non_blocking=True)
+        # La inferencia (en el stream actual de PyTorch) espera a que terminen ambos slots.
+        inference_stream = torch.cuda.current_stream()
+        for slot in self._gpu_slots:
+            inference_stream.wait_stream(slot['torch_stream'])
+        return self._gpu_batch[:len(cv_images)]
+
+    # Convierte un lote de mensajes a imagenes OpenCV, ejecuta la inferencia de YOLO sobre
+    # todo el lote en una sola llamada y publica los resultados de cada frame.
+    #
+    # Args:
+    #   batch_msgs (list[sensor_msgs.msg.Image]): Mensajes de imagen a procesar, en orden de llegada.
+    def _process_batch(self, batch_msgs):
+        valid_msgs = []
+        cv_images = []
+        for msg in batch_msgs:
+            try:
+                cv_images.append(self._image_msg_to_array(msg))
+                valid_msgs.append(msg)
+            except CvBridgeError as e:
+                self.get_logger().error(f'Error de CvBridge al convertir la imagen: {e}')
+        if not cv_images:
             return
 
-        person_detected_flag = False # Asumir que no hay persona por defecto en este frame
+        source = cv_images
+        if self._gpu_preprocessing:
+            try:
+                source = self._preprocess_batch_on_gpu(cv_images)
+            except Exception as e:
+                # Si OpenCV-CUDA falla (version sin cudaPtr, memoria, etc.) se vuelve al preprocesado de Ultralytics.
+                self.get_logger().warn(f"Preprocesado en GPU desactivado por error, se usara la CPU: {e}")
+                self._gpu_preprocessing = False
 
         # --- Bloque de Deteccion de Personas ---
         try:
-            # Ejecuta la inferencia del modelo YOLO sobre la imagen
-            results = self.yolo_model(cv_image, verbose=False, conf=self.confidence_threshold)
-
-            # Itera sobre las detecciones encontradas en el frame
-            for detection in results[0].boxes.data.tolist():
-                x1, y1, x2, y2, score, class_id = detection
-
-                # Comprueba si la clase detectada es la de 'person'
-                if int(class_id) == self.person_class_id:
-                    self.get_logger().info(f"¡Persona detectada! (Confianza: {score:.2f})", throttle_duration_sec=2) # Loguea con throttle para no inundar la consola
-                    person_detected_flag = True # Activa la bandera
-                    break # Sale del bucle de detecciones, ya que con una persona es suficiente.
+            # Ejecuta la inferencia del modelo YOLO sobre todo el lote de imagenes.
+            # 'classes' filtra a solo personas dentro del NMS, asi cualquier caja resultante es una persona.
+            results = self.yolo_model(source, imgsz=self.inference_imgsz, verbose=False,
+                                      conf=self.confidence_threshold, classes=[self.person_class_id])
         except Exception as e:
             self.get_logger().error(f"Error durante la inferencia con YOLO: {e}", throttle_duration_sec=10)
-            person_detected_flag = False # Considera como no detectado si hay un error
+            results = [None] * len(valid_msgs) # Considera como no detectado si hay un error
         # --- Fin Deteccion ---
 
+        for msg, result in zip(valid_msgs, results):
+            # Sin errores de inferencia, hay persona si quedo al menos una caja tras el filtro por clase.
+            person_detected_flag = result is not None and len(result.boxes) > 0
+            if person_detected_flag:
+                self.get_logger().info("¡Persona detectada!", throttle_duration_sec=2) # Loguea con throttle para no inundar la consola
+            self._publish_detection_result(msg, person_detected_flag)
+
+    # Publica el resultado de deteccion de un frame.
+    #
+    # Args:
+    #   msg (sensor_msgs.msg.Image): El mensaje de imagen original del frame.
+    #   person_detected_flag (bool): Si se detecto una persona en el frame.
+    def _publish_detection_result(self, msg: Image, person_detected_flag: bool):
         # --- Bloque de Publicacion de Resultados ---
-        # 1. Publica siempre el estado de deteccion (True/False) en el topic de estado.
-        status_msg = Bool(); status_msg.data = person_detected_flag
-        self.status_publisher_.publish(status_msg)
+        # 1. Publica el estado de deteccion (True/False) en el topic de estado si cambio.
+        self._publish_status(person_detected_flag)
 
         # 2. Publica la imagen original COMPLETA solo si se detecto una persona.
         if person_detected_flag:
@@ -163,9 +485,28 @@ class PersonDetectorNode(Node):
                 self.get_logger().error(f"Error al publicar la imagen con deteccion: {e}")
         # --- Fin Publicar Resultados ---
 
+    # Publica el estado de deteccion solo en los cambios (flancos) o cuando ha pasado
+    # status_heartbeat_sec desde la ultima publicacion, en lugar de en cada frame.
+    #
+    # Args:
+    #   person_detected_flag (bool): El estado de deteccion actual.
+    def _publish_status(self, person_detected_flag: bool):
+        now = time.monotonic()
+        if person_detected_flag == self._last_status and (now - self._last_status_pub_time) < self._status_heartbeat_sec:
+            return
+        self._status_msg.data = person_detected_flag
+        self.status_publisher_.publish(self._status_msg)
+        self._last_status = person_detected_flag
+        self._last_status_pub_time = now
+
     # Metodo para una limpieza ordenada al destruir el nodo.
     def destroy_node(self):
         self.get_logger().info("Cerrando el nodo detector de personas...")
+        # Detiene el hilo de inferencia antes de liberar el modelo
+        with self._frame_condition:
+            self._inference_worker_running = False
+            self._frame_condition.notify_all()
+        self._inference_thread.join(timeout=5.0)
         # Liberacion de recursos (opcional, Python y rclpy suelen manejarlo)
         try:
             del self.yolo_model
@@ -180,7 +521,10 @@ def main(args=None):
     person_detector_node = None
     try:
         person_detector_node = PersonDetectorNode()
-        rclpy.spin(person_detector_node) # Mantiene el nodo activo, procesando callbacks en bucle.
+        # Executor multihilo: la recepcion de imagenes no compite con la publicacion de resultados.
+        executor = MultiThreadedExecutor()
+        executor.add_node(person_detector_node)
+        executor.spin() # Mantiene el nodo activo, procesando callbacks en bucle.
     except KeyboardInterrupt:
         print('Cierre del nodo solicitado por el usuario (Ctrl+C).')
     except Exception as e:
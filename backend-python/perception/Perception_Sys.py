@@ -21,12 +21,24 @@
 import qi
 import time
 import functools
+import threading
+
+# Periodo de vaciado de las actualizaciones de estado acumuladas por los callbacks (microsegundos)
+STATUS_FLUSH_PERIOD_US = 50000
 
 # --- Placeholder para la Interaccion con el Estado Centralizado ---
 # En una implementacion completa, esta funcion interactuaria con un almacen de
 # datos, una base de datos vectorial, o un objeto de estado compartido (ej. Robot_Status).
 # Aqui, simplemente imprime los datos en la consola para demostrar que se reciben.
+# Las senales y el sondeo suelen repetir el mismo valor (postura, bateria, numero de
+# humanos), por lo que se guarda el ultimo valor por clave y se ignoran los repetidos.
+# Los dict/list se guardan como copia, ya que algunos callbacks reutilizan el mismo objeto.
+_last_status_values = {}
+_NO_VALUE = object()
+
 def update_robot_status(key, value):
+    if _last_status_values.get(key, _NO_VALUE) == value: return
+    _last_status_values[key] = value.copy() if isinstance(value, (dict, list)) else value
     timestamp = time.time()
     # Se podria anadir logica aqui para formatear valores complejos antes de guardarlos.
     value_repr = repr(value)
@@ -35,6 +47,20 @@ def update_robot_status(key, value):
     print(f"[{timestamp:.2f}][Perception EVENT/POLL -> RobotStatus] {key} = {value_repr}")
 # ------------------------------------------------------------------
 
+# Claves de ALMemory que se sondean periodicamente y el nombre con el que se publica cada una.
+# Se leen todas con una unica llamada getListData (un solo viaje RPC por ciclo de sondeo).
+POLLED_MEMORY_KEYS = (
+    ("Device/SubDeviceList/Battery/Charge/Sensor/Value", "battery_level"),
+)
+
+# Nombres de los sensores tactiles que reporta el evento 'TouchChanged' de ALMemory en Pepper.
+# Es un conjunto fijo, por lo que su estado se guarda en un diccionario reservado una sola vez.
+TACTILE_SENSOR_NAMES = (
+    "Head", "Head/Touch/Front", "Head/Touch/Middle", "Head/Touch/Rear",
+    "LArm", "LHand/Touch/Back", "RArm", "RHand/Touch/Back",
+    "Base", "Bumper/FrontLeft", "Bumper/FrontRight", "Bumper/Back",
+)
+
 # Gestiona las suscripciones a eventos de los servicios NAOqi y el sondeo (polling)
 # periodico de datos para recopilar informacion de percepcion del robot y su entorno.
 class PerceptionModule:
@@ -71,59 +97,90 @@ class PerceptionModule:
 
         # Almacenamiento para gestionar y limpiar las suscripciones
         self._subscribers = {}      # Para suscriptores de ALMemory
-        self._signal_links = {}     # Para senales directas de servicios
+        self._signal_links = {}     # (servicio, senal) -> (link_id, objeto senal) para desconectar directamente
         self._is_running = False    # Bandera para controlar el estado del modulo
+        # Listas paralelas de claves de ALMemory y nombres de estado para update_polled_data
+        self._polled_keys = [memory_key for memory_key, _ in POLLED_MEMORY_KEYS]
+        self._polled_status_names = [status_name for _, status_name in POLLED_MEMORY_KEYS]
+        # Estado de los sensores tactiles, actualizado en sitio por _on_touch_changed
+        self._touch_state = {name: False for name in TACTILE_SENSOR_NAMES}
+        # Actualizaciones pendientes de los callbacks (clave -> ultimo valor). Una rafaga de eventos
+        # se agrupa aqui y se vacia cada STATUS_FLUSH_PERIOD_US con una sola pasada por update_robot_status.
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_task = qi.PeriodicTask()
+        self._flush_task.setCallback(self._flush_pending_status)
+        self._flush_task.setUsPeriod(STATUS_FLUSH_PERIOD_US)
 
         print("[PerceptionModule] Proxies de servicio recibidos correctamente.")
 
     # --- Callbacks para Senales y Eventos de NAOqi ---
     # Cada uno de estos metodos es llamado automaticamente cuando ocurre un evento especifico en el robot.
-    # Su funcion es tomar los datos del evento y pasarlos al actualizador de estado central.
+    # Su funcion es tomar los datos del evento y encolarlos para el actualizador de estado central.
+
+    # Registra una actualizacion pendiente; si la clave ya estaba pendiente, solo se conserva el ultimo valor.
+    def _queue_status_update(self, key, value):
+        with self._pending_lock:
+            self._pending[key] = value
+
+    # Vacia las actualizaciones pendientes hacia update_robot_status. La llama qi.PeriodicTask
+    # cada STATUS_FLUSH_PERIOD_US y shutdown_subscriptions una ultima vez al terminar.
+    def _flush_pending_status(self):
+        with self._pending_lock:
+            if not self._pending: return
+            pending, self._pending = self._pending, {}
+            if "touched_sensors" in pending: # Copia para no leerlo mientras otro evento lo modifica
+                pending["touched_sensors"] = self._touch_state.copy()
+        for key, value in pending.items():
+            update_robot_status(key, value)
 
     def _on_touch_changed(self, value):
         # Callback para el evento 'TouchChanged' de ALMemory.
+        # Actualiza en sitio el diccionario preexistente en lugar de construir uno nuevo por evento.
         if not self._is_running or not value: return
-        touched_sensors = {name: state for name, state in value}
-        update_robot_status("touched_sensors", touched_sensors)
+        with self._pending_lock:
+            for name, state in value:
+                self._touch_state[name] = state
+            self._pending["touched_sensors"] = self._touch_state
 
     def _on_tactile_gesture(self, gesture_name):
         # Callback para la senal 'onGesture' de ALTactileGesture.
         if not self._is_running or not gesture_name: return
-        update_robot_status("last_tactile_gesture", gesture_name)
+        self._queue_status_update("last_tactile_gesture", gesture_name)
 
     def _on_word_recognized(self, value):
         # Callback para el evento 'WordRecognized' de ALMemory (usado por ASR).
         if not self._is_running or not isinstance(value, list) or len(value) < 2: return
         word, confidence = value[0], value[1]
         if confidence > 0.45: # Filtrar por confianza
-            update_robot_status("last_word_recognized", word)
-            update_robot_status("last_word_confidence", confidence)
+            self._queue_status_update("last_word_recognized", word)
+            self._queue_status_update("last_word_confidence", confidence)
 
     def _on_robot_mood_changed(self, state):
         # Callback para la senal 'stateChanged' de ALRobotMood.
         if not self._is_running: return
-        update_robot_status("robot_mood_state", state) # Ej: {"pleasure":"positive", "excitement":"calm"}
+        self._queue_status_update("robot_mood_state", state) # Ej: {"pleasure":"positive", "excitement":"calm"}
 
     def _on_human_valence_changed(self, valence_state):
         # Callback para la senal 'valenceChanged' de ALMood.
         if not self._is_running: return
-        update_robot_status("human_valence", valence_state) # Ej: "positive", "neutral", "negative"
+        self._queue_status_update("human_valence", valence_state) # Ej: "positive", "neutral", "negative"
 
     def _on_human_attention_changed(self, attention_state):
         # Callback para la senal 'attentionChanged' de ALMood.
         if not self._is_running: return
-        update_robot_status("human_attention", attention_state) # Ej: "looking", "not_looking"
+        self._queue_status_update("human_attention", attention_state) # Ej: "looking", "not_looking"
 
     def _on_ambiance_changed(self, ambiance_state):
         # Callback para la senal 'ambianceChanged' de ALMood.
         if not self._is_running: return
-        update_robot_status("environment_ambiance", ambiance_state) # Ej: "calm", "agitated"
+        self._queue_status_update("environment_ambiance", ambiance_state) # Ej: "calm", "agitated"
 
     def _on_humans_around_changed(self, humans_list):
         # Callback para la senal 'humansAround' de ALHumanAwareness.
         if not self._is_running: return
         num_humans = len(humans_list) if humans_list else 0
-        update_robot_status("humans_around_count", num_humans)
+        self._queue_status_update("humans_around_count", num_humans)
         # En una implementacion mas avanzada, se podrian extraer mas datos de cada humano detectado.
 
     # --- Metodos de Configuracion y Limpieza de Suscripciones ---
@@ -138,6 +195,7 @@ class PerceptionModule:
         if self._is_running: return True
         print("[PerceptionModule] Configurando suscripciones a eventos de NAOqi...")
         self._is_running = True
+        self._flush_task.start(True) # Empieza a vaciar las actualizaciones de los callbacks
         success = True
         try:
             # --- Suscripciones Obligatorias ---
@@ -145,39 +203,39 @@ class PerceptionModule:
             touch_sub = self.memory.subscriber("TouchChanged")
             self._subscribers["TouchChanged"] = touch_sub
             link_id = touch_sub.signal.connect(self._on_touch_changed)
-            self._signal_links[("ALMemory", "TouchChanged")] = link_id
+            self._signal_links[("ALMemory", "TouchChanged")] = (link_id, touch_sub.signal)
             print("   - Suscrito a ALMemory:TouchChanged.")
 
             # Senal para gestos tactiles (ej. doble toque en la cabeza)
             link_id = self.tactile_gesture.onGesture.connect(self._on_tactile_gesture)
-            self._signal_links[("ALTactileGesture", "onGesture")] = link_id
+            self._signal_links[("ALTactileGesture", "onGesture")] = (link_id, self.tactile_gesture.onGesture)
             print("   - Suscrito a ALTactileGesture.onGesture.")
 
             # --- Suscripciones Opcionales (si se proporcionaron los proxies) ---
             if self.robot_mood:
                 try:
                     link_id = self.robot_mood.stateChanged.connect(self._on_robot_mood_changed)
-                    self._signal_links[("ALRobotMood", "stateChanged")] = link_id
+                    self._signal_links[("ALRobotMood", "stateChanged")] = (link_id, self.robot_mood.stateChanged)
                     print("   - Suscrito a ALRobotMood.stateChanged.")
                 except Exception as e: print(f"   - WARN: Fallo al suscribir a ALRobotMood.stateChanged: {e}")
 
             if self.mood:
                 try:
                     link_id = self.mood.valenceChanged.connect(self._on_human_valence_changed)
-                    self._signal_links[("ALMood", "valenceChanged")] = link_id
+                    self._signal_links[("ALMood", "valenceChanged")] = (link_id, self.mood.valenceChanged)
                     print("   - Suscrito a ALMood.valenceChanged.")
                     link_id = self.mood.attentionChanged.connect(self._on_human_attention_changed)
-                    self._signal_links[("ALMood", "attentionChanged")] = link_id
+                    self._signal_links[("ALMood", "attentionChanged")] = (link_id, self.mood.attentionChanged)
                     print("   - Suscrito a ALMood.attentionChanged.")
                     link_id = self.mood.ambianceChanged.connect(self._on_ambiance_changed)
-                    self._signal_links[("ALMood", "ambianceChanged")] = link_id
+                    self._signal_links[("ALMood", "ambianceChanged")] = (link_id, self.mood.ambianceChanged)
                     print("   - Suscrito a ALMood.ambianceChanged.")
                 except Exception as e: print(f"   - WARN: Fallo al suscribir a senales de ALMood: {e}")
 
             if self.human_awareness:
                 try:
                     link_id = self.human_awareness.humansAround.connect(self._on_humans_around_changed)
-                    self._signal_links[("HumanAwareness", "humansAround")] = link_id
+                    self._signal_links[("HumanAwareness", "humansAround")] = (link_id, self.human_awareness.humansAround)
                     print("   - Suscrito a HumanAwareness.humansAround.")
                 except Exception as e: print(f"   - WARN: Fallo al suscribir a HumanAwareness.humansAround: {e}")
 
@@ -189,7 +247,7 @@ class PerceptionModule:
                     word_sub = self.memory.subscriber("WordRecognized")
                     self._subscribers["WordRecognized"] = word_sub
                     link_id = word_sub.signal.connect(self._on_word_recognized)
-                    self._signal_links[("ALMemory", "WordRecognized")] = link_id
+                    self._signal_links[("ALMemory", "WordRecognized")] = (link_id, word_sub.signal)
                     print("   - Suscrito a ALMemory:WordRecognized.")
                 except Exception as e_asr: print(f"   - ADVERTENCIA: Fallo en configuracion o suscripcion a ASR de Naoqi: {e_asr}")
 
@@ -207,30 +265,15 @@ class PerceptionModule:
         if not self._is_running: return
         print("[PerceptionModule] Terminando todas las suscripciones activas...")
         self._is_running = False
-        # Itera sobre una copia de los items para poder modificar el diccionario original
-        links_to_disconnect = list(self._signal_links.items())
-        for key, link_id in links_to_disconnect:
+        # Cada enlace guarda la senal exacta a la que se conecto (del suscriptor de ALMemory
+        # o del proxy del servicio), por lo que basta con desconectarla directamente.
+        for (service_name_str, signal_name), (link_id, signal) in self._signal_links.items():
             try:
-                service_proxy = None; signal_name = None; is_memory_event = False
-                # Logica para obtener el proxy correcto basado en la clave guardada, ya que los nombres
-                # de los atributos de la clase no siempre coinciden con los nombres de los servicios.
-                if isinstance(key, tuple): service_name_str, signal_name = key; service_proxy = getattr(self, service_name_str.lower().replace('al',''), None);
-                else: service_name_str = "ALMemory"; signal_name = key; service_proxy = self.memory; is_memory_event = True
-                # Casos especiales si el nombre del atributo no coincide
-                if service_name_str == "ALTactileGesture" and not service_proxy: service_proxy = self.tactile_gesture
-                if service_name_str == "ALRobotMood" and not service_proxy: service_proxy = self.robot_mood
-                if service_name_str == "ALMood" and not service_proxy: service_proxy = self.mood
-                if service_name_str == "HumanAwareness" and not service_proxy: service_proxy = self.human_awareness
-
-                if service_proxy:
-                    if is_memory_event: # Los eventos de ALMemory se desconectan a traves del suscriptor
-                        subscriber = self._subscribers.get(signal_name);
-                        if subscriber: subscriber.signal.disconnect(link_id); print(f"   - Suscriptor {service_name_str}:{signal_name} desconectado.")
-                    else: # Las senales directas se desconectan del proxy del servicio
-                        signal = getattr(service_proxy, signal_name, None)
-                        if signal: signal.disconnect(link_id); print(f"   - Senal {service_name_str}.{signal_name} desconectada.")
-            except Exception as e: print(f"   - ERROR desconectando suscripcion '{key}': {e}")
+                signal.disconnect(link_id); print(f"   - Senal {service_name_str}.{signal_name} desconectada.")
+            except Exception as e: print(f"   - ERROR desconectando suscripcion '{service_name_str}.{signal_name}': {e}")
         self._subscribers.clear(); self._signal_links.clear() # Limpia los diccionarios
+        self._flush_task.stop()
+        self._flush_pending_status() # Publica lo que quedara pendiente tras el ultimo ciclo
         print("[PerceptionModule] Suscripciones terminadas.")
 
     # Obtiene datos mediante sondeo (polling) que no estan disponibles a traves de eventos.
@@ -239,17 +282,25 @@ class PerceptionModule:
     def update_polled_data(self):
         if not self._is_running: return # No hacer nada si el modulo no esta activo
 
-        # Sondeo del nivel de bateria
+        # La postura es otro servicio: se lanza de forma asincrona para que su RPC
+        # viaje en paralelo con la lectura de ALMemory.
+        try:
+            posture_future = self.posture.getPosture(_async=True)
+        except Exception:
+            posture_future = None
+
+        # Sondeo de todas las claves de ALMemory (ej. nivel de bateria) en una sola llamada
         try:
-            battery_level = round(self.memory.getData("Device/SubDeviceList/Battery/Charge/Sensor/Value"), 3)
-            update_robot_status("battery_level", battery_level)
+            values = self.memory.getListData(self._polled_keys)
+            for status_name, value in zip(self._polled_status_names, values):
+                update_robot_status(status_name, round(value, 3) if isinstance(value, float) else value)
         except Exception:
-            update_robot_status("battery_level", None) # Informa que no se pudo obtener
+            for status_name in self._polled_status_names:
+                update_robot_status(status_name, None) # Informa que no se pudo obtener
 
         # Sondeo de la postura actual
         try:
-            posture = self.posture.getPosture()
-            update_robot_status("robot_posture", posture)
+            update_robot_status("robot_posture", posture_future.value())
         except Exception:
             update_robot_status("robot_posture", "Unknown")
 
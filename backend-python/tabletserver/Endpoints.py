@@ -13,11 +13,17 @@
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.requests import Request
+from fastapi.responses import Response
+import orjson
 import logging
+import time
 
 # Importacion relativa del modulo Messages, que contiene helpers para el formato de los mensajes JSON.
 from . import Messages as messages
-from typing import Any # Para el type hint de la interfaz del servidor
+from typing import Any, Union, TYPE_CHECKING # Para el type hint de la interfaz del servidor
+
+if TYPE_CHECKING:
+    import httpx
 
 # Configuracion del logger para este modulo
 log = logging.getLogger(__name__)
@@ -26,13 +32,59 @@ log = logging.getLogger(__name__)
 # Este router sera luego incluido en la aplicacion principal de FastAPI en ServerWeb.py.
 router = APIRouter()
 
+# Cache en memoria de la respuesta de /status ya serializada. Los sondeos frecuentes de salud
+# reutilizan el mismo cuerpo durante STATUS_CACHE_TTL_SEC segundos en lugar de reconstruirlo.
+STATUS_CACHE_TTL_SEC = 1.0
+_STATUS_CACHE: dict = {"ts": float("-inf"), "body": b""}
+
+# Tamano maximo (en bytes UTF-8) de un mensaje del cliente, definido en Messages; uno mayor se
+# rechaza antes de parsearlo para no gastar CPU en el. Uvicorn se lanza con ws_max_size algo mayor
+# (Messages.WS_MAX_FRAME_BYTES) para que este rechazo, con su mensaje de error, sea alcanzable.
+_MAX_MSG_BYTES = messages.MAX_CLIENT_MESSAGE_BYTES
+
+# Mensaje de error critico (interfaz principal no disponible), codificado una sola vez al importar.
+# Su marca de tiempo queda fija, lo cual es aceptable para un error terminal que cierra la conexion.
+_CRITICAL_ERR_BYTES = messages.craft_system_message("Servidor", "error", "Error interno critico del servidor de logica. No se pueden procesar mensajes.")
+
+# Recibe el siguiente frame del cliente tal cual llega, sin forzar una conversion:
+# los frames binarios se devuelven como bytes (orjson los parsea sin decodificar a str)
+# y los de texto como str. El cliente Android actual envia frames de texto.
+#
+# Raises:
+#   WebSocketDisconnect: Si el cliente cierra la conexion.
+async def _receive_client_frame(websocket: WebSocket) -> Union[str, bytes]:
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("bytes")
+    return data if data is not None else message.get("text", "")
+
+# Devuelve el tamano en bytes de un frame recibido, para compararlo con _MAX_MSG_BYTES. Un frame
+# de texto solo se codifica a UTF-8 cuando podria superar el limite (cada caracter ocupa como
+# maximo 4 bytes); si no puede superarlo se devuelve su longitud en caracteres, que ya queda por
+# debajo del limite, y los mensajes habituales no pagan la copia.
+def _frame_size_bytes(data: Union[str, bytes]) -> int:
+    if isinstance(data, bytes) or len(data) * 4 <= _MAX_MSG_BYTES:
+        return len(data)
+    return len(data.encode("utf-8"))
+
+# Dependencia de FastAPI que devuelve el cliente HTTP compartido creado en el lifespan de ServerWeb.
+# Los endpoints que necesiten llamar a otros servicios deben usarla (Depends(get_http_client))
+# en lugar de crear su propio cliente, para reutilizar el pool de conexiones.
+async def get_http_client(request: Request) -> "httpx.AsyncClient":
+    return request.app.state.resources.http_client
+
 # Endpoint HTTP GET para verificar el estado y la salud del servidor.
 # Proporciona informacion basica como si la interfaz principal esta cargada
 # y el numero de clientes WebSocket activos.
-# Es util para diagnostico y monitoreo.
+# Es util para diagnostico y monitoreo. La respuesta se cachea durante STATUS_CACHE_TTL_SEC
+# y se devuelve como Response con el JSON ya serializado, sin pasar por el codificador de FastAPI.
 @router.get("/status", tags=["General"])
 async def get_status(request: Request):
     log.info("Solicitud recibida en el endpoint /status")
+    now = time.monotonic()
+    if now - _STATUS_CACHE["ts"] < STATUS_CACHE_TTL_SEC:
+        return Response(content=_STATUS_CACHE["body"], media_type="application/json")
     # Accede a la instancia de la interfaz principal a traves del estado de la aplicacion
     interface_instance = getattr(request.app.state, 'tablet_server_interface', None)
     interface_available = interface_instance is not None
@@ -40,12 +92,15 @@ async def get_status(request: Request):
     # Si la interfaz existe, obtiene el numero de clientes conectados
     if interface_available and hasattr(interface_instance, '_active_connections'):
         active_connections_count = len(interface_instance._active_connections)
-    return {
+    body = orjson.dumps({
         "status_api": "Endpoints de UmebotLogics activos",
         "service_port": getattr(request.app.state, 'actual_server_port', 'N/A'),
         "tablet_interface_loaded": interface_available,
         "active_websocket_clients": active_connections_count,
-    }
+    })
+    _STATUS_CACHE["ts"] = now
+    _STATUS_CACHE["body"] = body
+    return Response(content=body, media_type="application/json")
 
 # Endpoint WebSocket para la comunicacion bidireccional en tiempo real con los clientes (frontend).
 # Gestiona el ciclo de vida de la conexion de cada cliente:
@@ -65,47 +120,56 @@ async def websocket_bidirectional_endpoint(websocket: WebSocket):
         # Si la interfaz no esta configurada, es un error critico del servidor.
         log.error("CRITICO: TabletServerInterface no configurada en app.state. La funcionalidad del WebSocket estara deshabilitada.")
         await websocket.accept() # Acepta la conexion para poder enviar un mensaje de error
-        await websocket.send_text(messages.craft_system_message("Servidor", "error", "Error interno critico del servidor de logica. No se pueden procesar mensajes."))
+        await websocket.send_bytes(_CRITICAL_ERR_BYTES)
         await websocket.close(code=1011) # Cierra la conexion con un codigo de error interno
         return
 
     await websocket.accept() # Acepta la conexion del cliente WebSocket
-    log.info(f"Cliente WebSocket CONECTADO: {websocket.client.host}:{websocket.client.port} al endpoint /ws_bidirectional")
+    log.info("Cliente WebSocket CONECTADO: %s:%s al endpoint /ws_bidirectional", websocket.client.host, websocket.client.port)
     # Notifica a la interfaz principal que un nuevo cliente se ha conectado, para que pueda gestionarlo.
     await server_interface.register_client_connection(websocket)
 
     try:
         # Bucle infinito para recibir mensajes mientras la conexion este activa
         while True:
-            # Espera a recibir un mensaje de texto del cliente
-            data_from_client_text = await websocket.receive_text()
-            log.debug(f"WS_RAW_RECV ({websocket.client}): '{data_from_client_text}'")
+            # Espera a recibir un mensaje (texto o binario) del cliente
+            data_from_client_text = await _receive_client_frame(websocket)
+            # Se comprueba el nivel antes de llamar: en el camino habitual (debug desactivado) no se construye ni la tupla de argumentos.
+            if log.isEnabledFor(logging.DEBUG): log.debug("WS_RAW_RECV (%s): %r", websocket.client, data_from_client_text)
+            frame_size = _frame_size_bytes(data_from_client_text)
+            if frame_size > _MAX_MSG_BYTES: # Comprobacion antes de cualquier parseo
+                log.warning("Mensaje demasiado grande recibido de %s (%d > %d bytes). Descartado.", websocket.client, frame_size, _MAX_MSG_BYTES)
+                server_interface.queue_message_for_client(websocket, messages.craft_system_message("Servidor", "error", f"Mensaje demasiado grande (maximo {_MAX_MSG_BYTES} bytes)."), essential=True)
+                continue
+            # Utiliza el modulo Messages para deserializar el JSON recibido en un diccionario Python.
+            # Si el cliente esta en modo de confianza, sus mensajes de gamepad solo pasan la comprobacion basica.
+            is_valid, client_msg = messages.deserialize_client_message(data_from_client_text, trusted=server_interface.is_client_trusted(websocket))
+            if not is_valid: # El mensaje no es un JSON valido o no tiene el formato esperado
+                server_interface.revoke_client_trust(websocket)
+                log.error("Mensaje invalido recibido de %s: %s", websocket.client, client_msg)
+                error_msg = messages.craft_system_message("Servidor", "error", f"Mensaje con formato invalido: {client_msg}")
+                server_interface.queue_message_for_client(websocket, error_msg, essential=True) # Envia un mensaje de error al cliente
+                continue
+            msg_type = client_msg.get("type")
             try:
-                # Utiliza el modulo Messages para deserializar el string JSON recibido en un diccionario Python.
-                client_msg_dict = messages.deserialize_client_message(data_from_client_text)
                 # Delega el manejo del mensaje deserializado a la interfaz principal.
                 # Pasa el tipo, el payload y la instancia del websocket para que la interfaz sepa que hacer y a quien responder si es necesario.
-                await server_interface.handle_client_message(
-                    client_msg_dict.get("type"),
-                    client_msg_dict.get("payload"),
-                    websocket
-                )
-            except ValueError as e_val: # Error si el mensaje no es un JSON valido o no tiene el formato esperado
-                log.error(f"Mensaje invalido recibido de {websocket.client}: {e_val}")
-                error_msg = messages.craft_system_message("Servidor", "error", f"Mensaje con formato invalido: {e_val}")
-                await websocket.send_text(error_msg) # Envia un mensaje de error al cliente
-            except Exception as e_proc: # Cualquier otro error durante el procesamiento del mensaje
-                log.error(f"Error procesando mensaje de {websocket.client}: {e_proc}", exc_info=True)
+                await server_interface.handle_client_message(msg_type, client_msg.get("payload"), websocket)
+            except Exception as e_proc: # Cualquier error durante el procesamiento del mensaje
+                server_interface.revoke_client_trust(websocket) # Un payload no validado pudo causar el error (KeyError, TypeError...)
+                log.error("Error procesando mensaje de %s: %s", websocket.client, e_proc, exc_info=True)
                 error_msg = messages.craft_system_message("Servidor", "error", "Error interno del servidor al procesar el mensaje.")
-                await websocket.send_text(error_msg)
+                server_interface.queue_message_for_client(websocket, error_msg, essential=True)
+                continue
+            server_interface.record_valid_client_message(websocket, msg_type)
     except WebSocketDisconnect: # Se activa cuando el cliente cierra la conexion de forma normal
-        log.info(f"Cliente WebSocket {websocket.client} DESCONECTADO (cierre normal).")
+        log.info("Cliente WebSocket %s DESCONECTADO (cierre normal).", websocket.client)
     except Exception as e_ws: # Cualquier otra excepcion inesperada en la conexion WebSocket
-        log.error(f"Excepcion en la conexion WebSocket con {websocket.client}: {e_ws}", exc_info=True)
+        log.error("Excepcion en la conexion WebSocket con %s: %s", websocket.client, e_ws, exc_info=True)
     finally:
         # Este bloque se ejecuta siempre, ya sea por desconexion normal o por error.
         # Asegura que el cliente sea desregistrado de la interfaz principal para evitar conexiones "fantasma".
-        log.info(f"Desregistrando cliente WebSocket {websocket.client} del manejador (bloque finally).")
+        log.info("Desregistrando cliente WebSocket %s del manejador (bloque finally).", websocket.client)
         await server_interface.unregister_client_connection(websocket)
 
 log.info("Modulo Endpoints.py cargado. El router con los endpoints /status y /ws_bidirectional esta definido y listo para ser incluido.")
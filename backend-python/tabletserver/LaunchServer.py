@@ -13,6 +13,19 @@
 import uvicorn  # El servidor ASGI (Asynchronous Server Gateway Interface) que ejecuta FastAPI
 import os
 import logging
+from Messages import WS_MAX_FRAME_BYTES # Limite de frame WebSocket compartido con Endpoints y TabletInterface
+
+# uvloop y httptools son opcionales (uvloop no existe en Windows). Si estan instalados se usan
+# como bucle de eventos y parser HTTP, reduciendo el coste por frame WebSocket; si no, Uvicorn
+# vuelve a sus implementaciones por defecto en Python puro.
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+try:
+    import httptools
+except ImportError:
+    httptools = None
 
 # --- Seccion de Configuracion ---
 # Lee la configuracion del servidor desde variables de entorno, con valores por defecto si no se definen.
@@ -21,6 +34,8 @@ LOG_LEVEL_NAME = os.getenv("LOG_LEVEL", "info").lower()
 SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
 # Asegurarse que el puerto por defecto coincida con las expectativas de otros modulos.
 SERVER_PORT = int(os.getenv("SERVER_PORT", 8080))
+# Numero de procesos de Uvicorn. Por defecto 1: el estado de las conexiones WebSocket vive en memoria del proceso.
+WORKERS = int(os.getenv("WORKERS", 1))
 
 # --- Seccion de Logging ---
 # Configura un logging basico para este script de lanzamiento, permitiendo ver los mensajes de inicio.
@@ -34,6 +49,7 @@ if __name__ == "__main__":
     log.info(f"Host de escucha: {SERVER_HOST}")
     log.info(f"Puerto de escucha: {SERVER_PORT}")
     log.info(f"Nivel de log configurado: {LOG_LEVEL_NAME}")
+    log.info(f"Workers: {WORKERS}, bucle: {'uvloop' if uvloop else 'asyncio'}, parser HTTP: {'httptools' if httptools else 'h11'}")
 
     # Llama a uvicorn.run para iniciar el servidor
     uvicorn.run(
@@ -43,5 +59,12 @@ if __name__ == "__main__":
         log_level=LOG_LEVEL_NAME.lower(), # Nivel de log que usara Uvicorn para sus propios mensajes.
         reload=False, # Cambiar a True solo para desarrollo, recarga el servidor al detectar cambios en el codigo.
                       # Requiere que Uvicorn este instalado con soporte para 'watchfiles'.
-        # loop="uvloop" # Descomentar si se instalo uvloop para usar su bucle de eventos de alto rendimiento.
+        workers=WORKERS,
+        loop="uvloop" if uvloop else "asyncio", # Bucle de eventos de alto rendimiento si uvloop esta instalado.
+        http="httptools" if httptools else "h11",
+        ws="websockets",
+        ws_max_size=WS_MAX_FRAME_BYTES,  # Algo mayor que el limite de mensaje de Endpoints, para que este pueda responder con su error.
+        ws_ping_interval=20,
+        ws_ping_timeout=20,
+        backlog=2048,
     )
@@ -12,9 +12,14 @@
 #                      validar rigurosamente los mensajes recibidos del cliente.
 # ----------------------------------------------------------------------------------
 
-import json
-import datetime
-from typing import Dict, Any, Literal, Union, Optional, List
+import orjson # Serializador JSON en C/Rust, mucho mas rapido que 'json' para los mensajes pequenos del WebSocket
+from datetime import datetime as _dt, timezone as _tz
+from typing import Dict, Any, Literal, Union, Optional, Tuple
+
+# Alias a nivel de modulo: las funciones craft_* se llaman varias veces por segundo y asi
+# evitan las busquedas de atributos (orjson.dumps, datetime.datetime.now, timezone.utc) en cada mensaje.
+_dumps = orjson.dumps
+_UTC = _tz.utc
 
 # --- Constantes para los Tipos de Mensaje ---
 # Usar constantes evita errores por "magic strings" (escribir strings directamente).
@@ -27,34 +32,60 @@ MSG_TYPE_CONFIG_CONFIRMATION = "config_confirmation" # Mensaje del servidor conf
 MSG_TYPE_PARTIAL_STT_RESULT = "partial_stt_result" # Mensaje con resultados parciales de STT
 MSG_TYPE_GAMEPAD_STATE = "gamepad_state"           # Mensaje con el estado completo del gamepad
 
+# --- Limites de Tamano de los Mensajes del Cliente ---
+# Tamano maximo (en bytes UTF-8) de un mensaje del cliente. Los mensajes 'input' pueden llevar
+# imagenes en base64 en 'payload.images', asi que el limite cubre varias fotos. Endpoints rechaza
+# los mayores antes de parsearlos y responde al cliente con un mensaje de error.
+MAX_CLIENT_MESSAGE_BYTES = 8 * 1024 * 1024
+# Limite de frame a nivel de protocolo (ws_max_size de Uvicorn). Es algo mayor que el anterior
+# para que un mensaje que lo supera por poco llegue a Endpoints y reciba el error explicativo;
+# solo los frames por encima de este valor se cortan en el protocolo (cierre 1009).
+WS_MAX_FRAME_BYTES = MAX_CLIENT_MESSAGE_BYTES + 1024 * 1024
+
 # --- Funciones Auxiliares ---
 
-# Funcion auxiliar interna para generar una marca de tiempo estandarizada
-# en formato ISO 8601 con zona horaria UTC.
-def _get_current_timestamp_utc() -> str:
-    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds') + 'Z'
+# Opciones de orjson para las marcas de tiempo: el datetime UTC se serializa directamente
+# como ISO 8601 con sufijo 'Z' y sin microsegundos, sin formatearlo en Python.
+_TIMESTAMP_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS
+# Igual, pero admitiendo claves no string (los ajustes de configuracion son arbitrarios).
+_NON_STR_KEYS_OPTIONS = _TIMESTAMP_OPTIONS | orjson.OPT_NON_STR_KEYS
+
+# Funcion auxiliar interna para generar una marca de tiempo estandarizada en UTC.
+# Devuelve el datetime tal cual; orjson lo convierte a ISO 8601 al serializar el mensaje.
+def _get_current_timestamp_utc() -> _dt:
+    return _dt.now(_UTC)
+
+# Funcion auxiliar interna que serializa un valor suelto (str, datetime...) a su literal JSON.
+# Para strings, orjson aplica el escapado JSON completo, asi que el resultado se puede
+# insertar de forma segura en las plantillas de mensajes de forma fija.
+def _to_json_literal(value: Any) -> bytes:
+    return _dumps(value, option=_TIMESTAMP_OPTIONS)
+
+# Plantillas preformateadas para los mensajes de forma fija y alta frecuencia. Solo se
+# interpolan los campos variables ya serializados con _to_json_literal, evitando construir y
+# serializar un diccionario completo por mensaje. Los mensajes con campos opcionales o
+# anidados (sistema con 'detail', configuracion) siguen usando el camino general dict + orjson.
+_INPUT_ECHO_TEMPLATE = b'{"type":"' + MSG_TYPE_INPUT.encode() + b'","timestamp":%s,"payload":{"text":%s,"source":%s}}'
+_OUTPUT_TEMPLATE = b'{"type":"' + MSG_TYPE_OUTPUT.encode() + b'","timestamp":%s,"payload":{"sender":%s,"text":%s,"original_input_source":%s}}'
+_SYSTEM_TEMPLATE = b'{"type":"' + MSG_TYPE_SYSTEM.encode() + b'","timestamp":%s,"payload":{"sender":%s,"level":%s,"text":%s}}'
+_PARTIAL_STT_RESULT_TEMPLATE = b'{"type":"' + MSG_TYPE_PARTIAL_STT_RESULT.encode() + b'","timestamp":%s,"payload":{"text":%s,"is_final":%s}}'
 
 # --- Funciones para Construir Mensajes (Servidor -> Cliente) ---
+# Todas devuelven el mensaje JSON ya codificado en UTF-8 (bytes), listo para enviarse por el
+# WebSocket sin volver a codificarlo.
 
 # Crea un mensaje para hacer eco de una entrada de texto del usuario,
 # indicando su origen (ej. 'stt', 'gui_manual').
-def craft_input_echo_message(text: str, source: Literal["gui", "stt", "stt_auto", "gui_manual", "unknown"]) -> str:
-    message = {
-        "type": MSG_TYPE_INPUT,
-        "timestamp": _get_current_timestamp_utc(),
-        "payload": {"text": text, "source": source}
-    }
-    return json.dumps(message)
+def craft_input_echo_message(text: str, source: Literal["gui", "stt", "stt_auto", "gui_manual", "unknown"]) -> bytes:
+    return _INPUT_ECHO_TEMPLATE % (_to_json_literal(_get_current_timestamp_utc()), _to_json_literal(text), _to_json_literal(source))
 
 # Crea un mensaje con una respuesta de un agente (ej. Umebot, sistema)
 # para ser mostrada en la interfaz de chat.
-def craft_output_message(sender_name: str, text: str, original_input_source: Literal["gui", "stt", "stt_auto", "gui_manual", "unknown"] = "unknown") -> str:
-    message = {
-        "type": MSG_TYPE_OUTPUT,
-        "timestamp": _get_current_timestamp_utc(),
-        "payload": {"sender": sender_name, "text": text, "original_input_source": original_input_source}
-    }
-    return json.dumps(message)
+def craft_output_message(sender_name: str, text: str, original_input_source: Literal["gui", "stt", "stt_auto", "gui_manual", "unknown"] = "unknown") -> bytes:
+    return _OUTPUT_TEMPLATE % (
+        _to_json_literal(_get_current_timestamp_utc()), _to_json_literal(sender_name),
+        _to_json_literal(text), _to_json_literal(original_input_source)
+    )
 
 # Crea un mensaje de sistema para notificar al cliente sobre eventos
 # informativos, advertencias o errores.
@@ -63,20 +94,22 @@ def craft_system_message(
     level: Literal["info", "warning", "error"],
     text: str,
     detail: Optional[Dict[str, Any]] = None
-) -> str:
-    payload_content = {"sender": sender_name, "level": level, "text": text}
-    if detail is not None:
-        payload_content["detail"] = detail
+) -> bytes:
+    if detail is None: # Caso habitual: forma fija, se usa la plantilla
+        return _SYSTEM_TEMPLATE % (
+            _to_json_literal(_get_current_timestamp_utc()), _to_json_literal(sender_name),
+            _to_json_literal(level), _to_json_literal(text)
+        )
     message = {
         "type": MSG_TYPE_SYSTEM,
         "timestamp": _get_current_timestamp_utc(),
-        "payload": payload_content
+        "payload": {"sender": sender_name, "level": level, "text": text, "detail": detail}
     }
-    return json.dumps(message)
+    return _dumps(message, option=_TIMESTAMP_OPTIONS)
 
 # Crea un mensaje para enviar el estado actual de la configuracion del
 # backend al cliente, usualmente al conectar o solicitarlo.
-def craft_current_configuration_message(settings: Dict[str, Any]) -> str:
+def craft_current_configuration_message(settings: Dict[str, Any]) -> bytes:
     message = {
         "type": MSG_TYPE_CURRENT_CONFIGURATION,
         "timestamp": _get_current_timestamp_utc(),
@@ -84,7 +117,8 @@ def craft_current_configuration_message(settings: Dict[str, Any]) -> str:
             "settings": settings
         }
     }
-    return json.dumps(message)
+    # OPT_NON_STR_KEYS: los ajustes son arbitrarios y 'json' aceptaba claves no string (ej. int).
+    return _dumps(message, option=_NON_STR_KEYS_OPTIONS)
 
 # Crea un mensaje para confirmar al cliente si un cambio de configuracion
 # fue exitoso, devolviendo el valor actual del item configurado.
@@ -93,7 +127,7 @@ def craft_config_confirmation_message(
     success: bool,
     current_value: Any,
     message_to_display: str
-) -> str:
+) -> bytes:
     message = {
         "type": MSG_TYPE_CONFIG_CONFIRMATION,
         "timestamp": _get_current_timestamp_utc(),
@@ -104,17 +138,14 @@ def craft_config_confirmation_message(
             "message_to_display": message_to_display
         }
     }
-    return json.dumps(message)
+    return _dumps(message, option=_NON_STR_KEYS_OPTIONS)
 
 # Crea un mensaje para enviar resultados parciales o finales de STT a la UI,
 # permitiendo una retroalimentacion en tiempo real mientras el usuario habla.
-def craft_partial_stt_result_message(partial_text: str, is_final: bool) -> str:
-    message = {
-        "type": MSG_TYPE_PARTIAL_STT_RESULT,
-        "timestamp": _get_current_timestamp_utc(),
-        "payload": {"text": partial_text, "is_final": is_final}
-    }
-    return json.dumps(message)
+def craft_partial_stt_result_message(partial_text: str, is_final: bool) -> bytes:
+    return _PARTIAL_STT_RESULT_TEMPLATE % (
+        _to_json_literal(_get_current_timestamp_utc()), _to_json_literal(partial_text), b"true" if is_final else b"false"
+    )
 
 
 # --- Funciones Auxiliares para Preparar Payloads (Uso en Cliente Python de Prueba) ---
@@ -144,22 +175,159 @@ def prepare_client_config_payload(config_item: str, value: Any) -> Dict[str, Any
 # Verifica que la estructura sea correcta, que contenga las claves 'type' y
 # 'payload', y que el contenido del payload sea valido para el tipo de mensaje
 # especifico (ej. validacion detallada para mensajes de gamepad).
+# El JSON se parsea una sola vez con orjson y el diccionario resultante se valida con los
+# validadores por tipo; el mensaje devuelto es ese mismo diccionario, con todos sus campos.
+# Para un cliente de confianza (que ya ha enviado muchos mensajes de gamepad validos seguidos)
+# sus mensajes 'gamepad_state' solo pasan la comprobacion basica de claves y tipos de los grupos
+# y sticks; el resto de tipos de mensaje se validan siempre por completo.
 #
 # Args:
-#   json_string (str): La cadena JSON recibida del cliente.
+#   json_data (str | bytes): El JSON recibido del cliente (texto o binario, orjson acepta ambos).
+#   trusted (bool): Si es True, se usa la comprobacion basica para los mensajes 'gamepad_state'.
 #
 # Returns:
-#   Dict[str, Any]: El mensaje deserializado como un diccionario Python.
-#
-# Raises:
-#   ValueError: Si el string no es un JSON valido o si el mensaje no
-#               cumple con la estructura esperada.
-def deserialize_client_message(json_string: str) -> Dict[str, Any]:
+#   Tuple[bool, Dict[str, Any] | str]: (True, mensaje deserializado como diccionario) si es valido,
+#       o (False, descripcion del error) si el JSON no es valido o el mensaje no cumple con la
+#       estructura esperada. Los errores se devuelven en lugar de lanzarse para que el bucle del
+#       WebSocket no necesite manejar excepciones en el camino habitual.
+def deserialize_client_message(json_data: Union[str, bytes], trusted: bool = False) -> Tuple[bool, Union[Dict[str, Any], str]]:
     try:
-        message = json.loads(json_string) # Intenta parsear el string JSON
-    except json.JSONDecodeError as e:
-        raise ValueError(f"El mensaje recibido no es un JSON valido: {e}")
+        message = orjson.loads(json_data) # Unico parseo del JSON
+    except orjson.JSONDecodeError as e:
+        return False, f"El mensaje recibido no es un JSON valido: {e}"
+    # Camino rapido para el flujo de alta frecuencia: un 'gamepad_state' correcto se acepta sin
+    # pasar por la validacion general (un payload completo es valido con o sin confianza).
+    if message.__class__ is dict and message.get("type") == MSG_TYPE_GAMEPAD_STATE and _gamepad_payload_is_valid(message.get("payload")):
+        return True, message
+    try:
+        return True, _validate_client_message(message, trusted=trusted)
+    except ValueError as e_val:
+        return False, str(e_val)
+
+# --- Funciones Auxiliares para la Validacion del Payload de GAMEPAD_STATE ---
+# Conjuntos de claves esperadas, creados una sola vez. La comprobacion de claves es una
+# inclusion de conjuntos y las listas de claves faltantes solo se construyen al fallar.
+_JOYSTICK_KEYS = frozenset(("x", "y"))
+_DPAD_KEYS = frozenset(("up", "down", "left", "right"))
+_ACTION_KEYS = frozenset(("a", "b", "x", "y"))
+_STICK_BTN_KEYS = frozenset(("l3_pressed", "r3_pressed"))
+_GAMEPAD_PAYLOAD_KEY_ORDER = ("left_stick", "right_stick", "dpad_events", "action_button_events", "stick_button_states")
+_GAMEPAD_PAYLOAD_KEYS = frozenset(_GAMEPAD_PAYLOAD_KEY_ORDER)
+_NUMERIC_TYPES = frozenset((int, float, bool)) # Los mismos que acepta isinstance(v, (int, float))
+
+# Comprobacion rapida del caso habitual (payload de gamepad correcto): accede directamente a las
+# claves esperadas sin construir mensajes de error. Devuelve False ante cualquier forma inesperada
+# (clave faltante, grupo que no es un diccionario, payload None...); en ese caso la validacion
+# detallada decide y genera el error concreto.
+def _gamepad_payload_is_valid(payload: Any) -> bool:
+    try:
+        left = payload["left_stick"]; right = payload["right_stick"]
+        dpad = payload["dpad_events"]; action = payload["action_button_events"]; stick_btn = payload["stick_button_states"]
+        if (left.__class__ is not dict or right.__class__ is not dict or dpad.__class__ is not dict
+                or action.__class__ is not dict or stick_btn.__class__ is not dict):
+            return False
+        if not (type(left["x"]) in _NUMERIC_TYPES and type(left["y"]) in _NUMERIC_TYPES
+                and type(right["x"]) in _NUMERIC_TYPES and type(right["y"]) in _NUMERIC_TYPES):
+            return False
+        for pressed in (dpad["up"], dpad["down"], dpad["left"], dpad["right"],
+                        action["a"], action["b"], action["x"], action["y"],
+                        stick_btn["l3_pressed"], stick_btn["r3_pressed"]):
+            if pressed is not True and pressed is not False:
+                return False
+    except (KeyError, TypeError):
+        return False
+    return True
+
+# Valida que un objeto de joystick dentro del payload tenga la estructura y tipos correctos.
+def _is_valid_joystick_object(stick_obj: Any, stick_name: str) -> bool:
+    if not isinstance(stick_obj, dict):
+        raise ValueError(f"'{stick_name}' debe ser un objeto (diccionario).")
+    if not _JOYSTICK_KEYS <= stick_obj.keys():
+        raise ValueError(f"'{stick_name}' debe contener las claves 'x' e 'y'.")
+    if not isinstance(stick_obj["x"], (int, float)) or not isinstance(stick_obj["y"], (int, float)):
+        raise ValueError(f"Los valores 'x' e 'y' de '{stick_name}' deben ser numericos.")
+    # Opcional: Se podria validar aqui que los valores esten en el rango [-1.0, 1.0].
+    return True
+
+# Valida que un objeto de grupo de botones dentro del payload tenga la estructura y tipos correctos.
+def _is_valid_button_object(button_obj: Any, button_group_name: str, expected_keys: frozenset) -> bool:
+    if not isinstance(button_obj, dict):
+        raise ValueError(f"'{button_group_name}' debe ser un objeto (diccionario).")
+    if not expected_keys <= button_obj.keys():
+        missing_keys = sorted(expected_keys - button_obj.keys())
+        raise ValueError(f"A '{button_group_name}' le faltan las claves: {missing_keys}.")
+    if not all(isinstance(button_obj[key], bool) for key in expected_keys):
+        non_bool_keys = sorted(k for k in expected_keys if not isinstance(button_obj[k], bool))
+        raise ValueError(f"Los valores en '{button_group_name}' deben ser booleanos. Claves no booleanas: {non_bool_keys}.")
+    return True
+# --- Fin de Funciones Auxiliares de Validacion ---
+
+# --- Validadores de Payload por Tipo de Mensaje ---
+
+# Valida el payload de un mensaje 'input'.
+def _validate_input_payload(payload: Dict[str, Any]) -> None:
+    if "text" not in payload or not isinstance(payload.get("text"), str):
+        raise ValueError(f"Mensaje '{MSG_TYPE_INPUT}' invalido: 'payload.text' es faltante o no es un string.")
+
+# Valida el payload de un mensaje 'config'.
+def _validate_config_payload(payload: Dict[str, Any]) -> None:
+    if "config_item" not in payload or not isinstance(payload.get("config_item"), str):
+        raise ValueError(f"Mensaje '{MSG_TYPE_CONFIG}' invalido: 'payload.config_item' es faltante o no es un string.")
+    if "value" not in payload:
+        raise ValueError(f"Mensaje '{MSG_TYPE_CONFIG}' invalido: 'payload.value' es faltante.")
+
+# Validacion detallada del payload de un mensaje 'gamepad_state'. El caso habitual (payload
+# correcto) se resuelve con la comprobacion rapida; solo si falla se recorren las comprobaciones
+# que generan el mensaje de error concreto.
+def _validate_gamepad_state_payload(payload: Dict[str, Any]) -> None:
+    if _gamepad_payload_is_valid(payload):
+        return
+    if not _GAMEPAD_PAYLOAD_KEYS <= payload.keys():
+        missing_key = next(key for key in _GAMEPAD_PAYLOAD_KEY_ORDER if key not in payload)
+        raise ValueError(f"Mensaje '{MSG_TYPE_GAMEPAD_STATE}' invalido: 'payload.{missing_key}' es faltante.")
+    try:
+        _is_valid_joystick_object(payload.get("left_stick"), "payload.left_stick")
+        _is_valid_joystick_object(payload.get("right_stick"), "payload.right_stick")
+
+        _is_valid_button_object(payload.get("dpad_events"), "payload.dpad_events", _DPAD_KEYS)
+        _is_valid_button_object(payload.get("action_button_events"), "payload.action_button_events", _ACTION_KEYS)
+        _is_valid_button_object(payload.get("stick_button_states"), "payload.stick_button_states", _STICK_BTN_KEYS)
+    except ValueError as e_val: # Captura y re-lanza los errores de validacion de las funciones auxiliares con mas contexto.
+        raise ValueError(f"El payload del mensaje '{MSG_TYPE_GAMEPAD_STATE}' es invalido: {e_val}")
+
+# Comprobacion basica del payload de 'gamepad_state' para clientes de confianza: estan todas las
+# claves, cada grupo es un diccionario y los sticks tienen 'x' e 'y' numericos (son los valores que
+# mueven la base del robot). Omite las comprobaciones de cada boton.
+def _check_gamepad_state_payload_shape(payload: Dict[str, Any]) -> None:
+    if not _GAMEPAD_PAYLOAD_KEYS <= payload.keys():
+        missing_key = next(key for key in _GAMEPAD_PAYLOAD_KEY_ORDER if key not in payload)
+        raise ValueError(f"Mensaje '{MSG_TYPE_GAMEPAD_STATE}' invalido: 'payload.{missing_key}' es faltante.")
+    if not all(isinstance(payload[key], dict) for key in _GAMEPAD_PAYLOAD_KEY_ORDER):
+        raise ValueError(f"Mensaje '{MSG_TYPE_GAMEPAD_STATE}' invalido: los grupos del payload deben ser objetos (diccionarios).")
+    try:
+        _is_valid_joystick_object(payload["left_stick"], "payload.left_stick")
+        _is_valid_joystick_object(payload["right_stick"], "payload.right_stick")
+    except ValueError as e_val:
+        raise ValueError(f"El payload del mensaje '{MSG_TYPE_GAMEPAD_STATE}' es invalido: {e_val}")
+
+# Tabla de validadores por tipo de mensaje. Sus claves son tambien los tipos que exigen un payload
+# de tipo diccionario; se guardan en un frozenset para comprobar la pertenencia sin crear listas.
+_PAYLOAD_VALIDATORS = {
+    MSG_TYPE_INPUT: _validate_input_payload,
+    MSG_TYPE_CONFIG: _validate_config_payload,
+    MSG_TYPE_GAMEPAD_STATE: _validate_gamepad_state_payload,
+}
+_PAYLOAD_REQUIRED_TYPES = frozenset(_PAYLOAD_VALIDATORS)
+# Validadores que sustituyen a los anteriores para un cliente de confianza. Solo 'gamepad_state'
+# (el flujo de alta frecuencia) tiene una version reducida.
+_TRUSTED_PAYLOAD_VALIDATORS = {
+    MSG_TYPE_GAMEPAD_STATE: _check_gamepad_state_payload_shape,
+}
 
+# Valida un mensaje del cliente ya parseado por deserialize_client_message.
+# Con trusted=True los tipos de _TRUSTED_PAYLOAD_VALIDATORS usan su comprobacion basica en
+# lugar de la validacion detallada; los demas tipos se validan igual que sin confianza.
+def _validate_client_message(message: Any, trusted: bool = False) -> Dict[str, Any]:
     if not isinstance(message, dict):
         raise ValueError("El mensaje JSON debe ser un objeto (diccionario).")
 
@@ -171,66 +339,16 @@ def deserialize_client_message(json_string: str) -> Dict[str, Any]:
 
     # La validacion especifica del payload depende del tipo de mensaje.
     # Se asegura que el payload sea un diccionario para los tipos que lo requieren.
-    if msg_type in [MSG_TYPE_INPUT, MSG_TYPE_CONFIG, MSG_TYPE_GAMEPAD_STATE]:
+    if msg_type in _PAYLOAD_REQUIRED_TYPES:
         if payload is None: # Primero se verifica que el payload no sea None.
             raise ValueError(f"El mensaje JSON es invalido: 'payload' es faltante para el tipo '{msg_type}'.")
         if not isinstance(payload, dict): # Si no es None, se verifica que sea un diccionario.
             raise ValueError(f"El mensaje JSON es invalido: 'payload' no es un objeto (diccionario) para el tipo '{msg_type}'.")
 
-    # --- Funciones Auxiliares para la Validacion del Payload de GAMEPAD_STATE ---
-    def _is_valid_joystick_object(stick_obj: Any, stick_name: str) -> bool:
-        # Valida que un objeto de joystick dentro del payload tenga la estructura y tipos correctos.
-        if not isinstance(stick_obj, dict):
-            raise ValueError(f"'{stick_name}' debe ser un objeto (diccionario).")
-        if not all(key in stick_obj for key in ["x", "y"]):
-            raise ValueError(f"'{stick_name}' debe contener las claves 'x' e 'y'.")
-        if not isinstance(stick_obj["x"], (int, float)) or not isinstance(stick_obj["y"], (int, float)):
-            raise ValueError(f"Los valores 'x' e 'y' de '{stick_name}' deben ser numericos.")
-        # Opcional: Se podria validar aqui que los valores esten en el rango [-1.0, 1.0].
-        return True
-
-    def _is_valid_button_object(button_obj: Any, button_group_name: str, expected_keys: List[str]) -> bool:
-        # Valida que un objeto de grupo de botones dentro del payload tenga la estructura y tipos correctos.
-        if not isinstance(button_obj, dict):
-            raise ValueError(f"'{button_group_name}' debe ser un objeto (diccionario).")
-        if not all(key in button_obj for key in expected_keys):
-            missing_keys = [k for k in expected_keys if k not in button_obj]
-            raise ValueError(f"A '{button_group_name}' le faltan las claves: {missing_keys}.")
-        if not all(isinstance(button_obj[key], bool) for key in expected_keys):
-            non_bool_keys = [k for k in expected_keys if not isinstance(button_obj[k], bool)]
-            raise ValueError(f"Los valores en '{button_group_name}' deben ser booleanos. Claves no booleanas: {non_bool_keys}.")
-        return True
-    # --- Fin de Funciones Auxiliares de Validacion ---
-
-    # Validaciones especificas por tipo de mensaje
-    if msg_type == MSG_TYPE_INPUT:
-        if "text" not in payload or not isinstance(payload.get("text"), str):
-            raise ValueError(f"Mensaje '{MSG_TYPE_INPUT}' invalido: 'payload.text' es faltante o no es un string.")
-    elif msg_type == MSG_TYPE_CONFIG:
-        if "config_item" not in payload or not isinstance(payload.get("config_item"), str):
-            raise ValueError(f"Mensaje '{MSG_TYPE_CONFIG}' invalido: 'payload.config_item' es faltante o no es un string.")
-        if "value" not in payload:
-            raise ValueError(f"Mensaje '{MSG_TYPE_CONFIG}' invalido: 'payload.value' es faltante.")
-
-    elif msg_type == MSG_TYPE_GAMEPAD_STATE: # Validacion detallada para el estado del gamepad
-        required_top_level_keys = ["left_stick", "right_stick", "dpad_events", "action_button_events", "stick_button_states"]
-        for key in required_top_level_keys:
-            if key not in payload:
-                raise ValueError(f"Mensaje '{MSG_TYPE_GAMEPAD_STATE}' invalido: 'payload.{key}' es faltante.")
-        try:
-            _is_valid_joystick_object(payload.get("left_stick"), "payload.left_stick")
-            _is_valid_joystick_object(payload.get("right_stick"), "payload.right_stick")
-
-            dpad_event_keys = ["up", "down", "left", "right"]
-            _is_valid_button_object(payload.get("dpad_events"), "payload.dpad_events", dpad_event_keys)
-
-            action_button_keys = ["a", "b", "x", "y"]
-            _is_valid_button_object(payload.get("action_button_events"), "payload.action_button_events", action_button_keys)
-
-            stick_button_keys = ["l3_pressed", "r3_pressed"]
-            _is_valid_button_object(payload.get("stick_button_states"), "payload.stick_button_states", stick_button_keys)
-        except ValueError as e_val: # Captura y re-lanza los errores de validacion de las funciones auxiliares con mas contexto.
-            raise ValueError(f"El payload del mensaje '{MSG_TYPE_GAMEPAD_STATE}' es invalido: {e_val}")
+    # Validaciones especificas por tipo de mensaje: cada tipo tiene su validador de payload.
+    validator = (_TRUSTED_PAYLOAD_VALIDATORS.get(msg_type) if trusted else None) or _PAYLOAD_VALIDATORS.get(msg_type)
+    if validator is not None:
+        validator(payload)
 
     # No se validan otros tipos de mensajes que el servidor no espera procesar desde el cliente.
     return message
@@ -18,68 +18,179 @@ import asyncio
 import logging
 import socket
 import os
-import httpx # Cliente HTTP asincrono, para futuras comunicaciones con otros servicios
+import functools
+import inspect
+import importlib.util
+import ipaddress
 from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse # Respuestas JSON serializadas con orjson (C/Rust) en lugar de 'json'
 from contextlib import asynccontextmanager
-from typing import Union, Optional
+from dataclasses import dataclass
+from typing import List, Union, Optional, TYPE_CHECKING
+from zeroconf import IPVersion, InterfaceChoice
 from zeroconf.asyncio import AsyncZeroconf, ServiceInfo # Para descubrimiento de servicios en red
 
+# httpx (cliente HTTP asincrono, para futuras comunicaciones con otros servicios) se importa dentro
+# del lifespan, donde se crea el cliente: las herramientas que importan este modulo sin servir
+# (introspeccion, volcado del esquema) no pagan la importacion de httpx/httpcore/h11.
+if TYPE_CHECKING:
+    import httpx
+
+# HTTP/2 en httpx necesita el paquete 'h2' (extra httpx[http2]); si no esta, el cliente usa HTTP/1.1.
+# Solo se comprueba que este instalado, sin importarlo.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# uvloop es opcional (no existe en Windows). Si esta instalado se fija como politica del bucle de
+# eventos al importar el modulo: los bucles creados despues (asyncio.run de main.py, Uvicorn) usan la
+# implementacion en C sobre libuv para sockets WebSocket y las llamadas de httpx.
+try:
+    import uvloop
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+except ImportError:
+    uvloop = None
+
+# ifaddr enumera las interfaces de red sin pasar por DNS. Es una dependencia de zeroconf, asi que
+# normalmente siempre esta; si faltara, el fallback de get_local_ip se limita a 127.0.0.1.
+try:
+    import ifaddr
+except ImportError:
+    ifaddr = None
+
 # Configuracion del logger para este modulo
 log = logging.getLogger(__name__)
 
+# Tiempo maximo para cada paso del apagado (desregistro Zeroconf, cierre de clientes). Con la red
+# caida estas llamadas pueden colgarse; se abandonan tras este tiempo para no bloquear la salida de Uvicorn.
+SHUTDOWN_STEP_TIMEOUT_SEC = 2.0
+
+# Configuracion fija del servicio Zeroconf, leida una sola vez al importar desde variables de entorno.
+_SERVICE_TYPE = os.getenv("ZEROCONF_SERVICE_TYPE", "_umebotlogics._tcp.local.")
+_SERVICE_NAME_FULL = f"{os.getenv('ZEROCONF_SERVICE_NAME', 'UmebotLogicsWebSocket')}.{_SERVICE_TYPE}"
+_SERVICE_PROPERTIES: dict = {}
+
+# Recursos y datos de red creados en el lifespan. Se guardan juntos en app.state.resources para que
+# el registro de Zeroconf y el apagado accedan a campos conocidos en lugar de comprobar atributos
+# sueltos de app.state con hasattr/getattr.
+@dataclass
+class LifespanResources:
+    http_client: Optional["httpx.AsyncClient"] = None
+    zc: Optional[AsyncZeroconf] = None
+    zc_info: Optional[ServiceInfo] = None # ServiceInfo registrado (lo rellena el apagado al recoger la tarea)
+    zc_register_task: Optional[asyncio.Task] = None
+    zc_service_info: Optional[ServiceInfo] = None # ServiceInfo construido, reutilizable en nuevos registros
+    # Datos de red calculados una sola vez y reutilizados en cada (re)registro de Zeroconf
+    local_ip: str = ""
+    local_ip_packed: bytes = b""
+    hostname: str = ""
+    zeroconf_port: int = 0
+
 # --- Funciones Auxiliares para Red y Descubrimiento ---
 
+# Indica si una IPv4 sirve para anunciar el servicio (no es loopback 127/8 ni link-local 169.254/16).
+def _is_advertisable_ipv4(ip: str) -> bool:
+    try:
+        address = ipaddress.IPv4Address(ip)
+    except ValueError:
+        return False
+    return not (address.is_loopback or address.is_link_local)
+
+# Enumera las IPv4 asignadas a las interfaces locales con ifaddr (consulta directa al sistema,
+# sin resolver el hostname ni pasar por DNS), en el orden en que las devuelve el sistema.
+#
+# Returns:
+#   List[str]: Las IPv4 de las interfaces; lista vacia si ifaddr no esta disponible.
+def _interface_ipv4_addresses() -> List[str]:
+    if ifaddr is None:
+        return []
+    return [adapter_ip.ip for adapter in ifaddr.get_adapters() for adapter_ip in adapter.ips if adapter_ip.is_IPv4]
+
+# Busca la primera IPv4 local anunciable entre las interfaces. Devuelve None si no encuentra
+# ninguna o si ifaddr no esta disponible.
+def _find_interface_ipv4() -> Optional[str]:
+    return next((ip for ip in _interface_ipv4_addresses() if _is_advertisable_ipv4(ip)), None)
+
 # Obtiene la direccion IP local de la maquina donde se ejecuta el servidor.
 # Intenta conectarse a una direccion externa para determinar la IP de la
-# interfaz de red correcta; si falla, recurre a metodos de fallback.
-# Es crucial para el registro en Zeroconf.
+# interfaz de red correcta (un connect UDP no envia datos ni bloquea); si falla,
+# enumera las interfaces de red y solo como ultimo recurso devuelve 127.0.0.1.
+# Ya no se usa gethostbyname(gethostname()), que podia bloquear segundos el arranque
+# con un /etc/hosts o DNS mal configurados.
+# Es crucial para el registro en Zeroconf. El resultado se cachea: la IP se detecta
+# una sola vez por proceso, aunque el servicio se vuelva a registrar.
+# Orden de precedencia: UMEBOT_ADVERTISE_IP (si esta definida y es una IPv4 valida se usa sin
+# ninguna deteccion; util en el despliegue del robot con interfaz fija o con varias interfaces/VPN),
+# despues el connect UDP, despues la enumeracion de interfaces y por ultimo 127.0.0.1.
 #
 # Returns:
 #   str: La direccion IP local detectada.
+@functools.lru_cache(maxsize=1)
 def get_local_ip() -> str:
+    override_ip = os.getenv("UMEBOT_ADVERTISE_IP")
+    if override_ip:
+        # Se valida antes de usarla: una IPv4 mal escrita romperia inet_aton y el registro Zeroconf
+        try:
+            ipaddress.IPv4Address(override_ip)
+        except ValueError:
+            log.warning(f"UMEBOT_ADVERTISE_IP='{override_ip}' no es una IPv4 valida; se ignora y se detecta la IP local.")
+        else:
+            log.debug(f"IP local para Zeroconf fijada por UMEBOT_ADVERTISE_IP: {override_ip}")
+            return override_ip
+    IP = None
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    s.settimeout(0.1)
+    s.settimeout(0.05)
     try:
         # Tecnica para obtener la IP preferida conectando a una IP externa (no se envian datos)
         s.connect(('10.255.255.255', 1))
         IP = s.getsockname()[0]
     except Exception:
-        # Fallback si el primer metodo falla
-        try:
-            IP = socket.gethostbyname(socket.gethostname())
-        except Exception:
-            IP = '127.0.0.1' # Ultimo recurso
+        pass
     finally:
         s.close()
+    if not IP or not _is_advertisable_ipv4(IP):
+        # Fallback si el primer metodo falla: enumeracion de interfaces, acotada en tiempo
+        IP = _find_interface_ipv4() or '127.0.0.1' # 127.0.0.1 como ultimo recurso
     log.debug(f"IP local detectada para Zeroconf: {IP}")
     return IP
 
+# Devuelve el hostname que se anuncia en Zeroconf: UMEBOT_HOSTNAME si esta definida y, si no,
+# socket.gethostname().
+def get_local_hostname() -> str:
+    return os.getenv("UMEBOT_HOSTNAME") or socket.gethostname()
+
 # Obtiene el puerto real en el que Uvicorn esta ejecutando el servidor.
 # Este valor se espera que sea inyectado en el estado de la app (app.state.actual_server_port)
 # por el script que lanza el servidor (ej. TabletInterface.py).
+# Se resuelve una sola vez en el lifespan (app.state.resources.zeroconf_port); no hace falta volver a llamarla.
 def get_actual_server_port_for_zeroconf(app_instance: FastAPI) -> int:
     default_port = int(os.getenv("SERVER_PORT_DEFAULT_ZEROCONF", 8080)) # Puerto por defecto de fallback
     actual_port = getattr(app_instance.state, 'actual_server_port', default_port)
     log.debug(f"Zeroconf usara el puerto del servidor: {actual_port}")
-    return actual_port
+    return int(actual_port)
 
 # Registra este servidor como un servicio en la red local usando Zeroconf.
 # Esto permite que los clientes (frontend) encuentren el servidor
 # automaticamente sin necesidad de configurar la IP y el puerto manualmente.
+# La IP, su forma empaquetada, el hostname y el puerto se leen de app.state.resources (calculados
+# una vez en el lifespan). El ServiceInfo se guarda alli mismo y se reutiliza en los siguientes
+# registros mientras la direccion, el puerto y el hostname no cambien.
 async def register_service(zc: AsyncZeroconf, app_for_zeroconf: FastAPI) -> Union[ServiceInfo, None]:
-    ip_address = get_local_ip()
-    hostname = socket.gethostname()
-    port_to_register = get_actual_server_port_for_zeroconf(app_for_zeroconf)
-    # Lee la configuracion del servicio desde variables de entorno para flexibilidad
-    service_type_env = os.getenv("ZEROCONF_SERVICE_TYPE", "_umebotlogics._tcp.local.")
-    service_name_base_env = os.getenv("ZEROCONF_SERVICE_NAME", "UmebotLogicsWebSocket")
-    service_name_full = f"{service_name_base_env}.{service_type_env}"
-    # Crea la informacion del servicio que se anunciara en la red
-    info = ServiceInfo(
-        type_=service_type_env, name=service_name_full,
-        addresses=[socket.inet_aton(ip_address)], port=port_to_register,
-        properties={}, server=f"{hostname}.local.",
-    )
+    res: LifespanResources = app_for_zeroconf.state.resources
+    ip_address = res.local_ip
+    packed_ip_address = res.local_ip_packed
+    port_to_register = res.zeroconf_port
+    service_name_full = _SERVICE_NAME_FULL
+    server_name = f"{res.hostname}.local."
+    # Reutiliza la informacion del servicio ya construida si sigue siendo valida; si no, la crea
+    info = res.zc_service_info
+    if info is None or info.port != port_to_register or info.server != server_name or info.addresses != [packed_ip_address]:
+        info = ServiceInfo(
+            type_=_SERVICE_TYPE, name=service_name_full,
+            addresses=[packed_ip_address], port=port_to_register,
+            properties=_SERVICE_PROPERTIES, server=server_name,
+        )
+        res.zc_service_info = info
     log.info(f"Intentando registrar servicio Zeroconf: Nombre='{service_name_full}', IP='{ip_address}', Puerto='{port_to_register}'")
     try:
         await zc.async_register_service(info) # Registra el servicio de forma asincrona
@@ -103,8 +214,9 @@ async def unregister_service(zc: AsyncZeroconf, info: Union[ServiceInfo, None]):
 
 # Gestor de ciclo de vida para la aplicacion FastAPI.
 # Se ejecuta al iniciar y al apagar el servidor.
-# - Al iniciar: Crea un cliente HTTP asincrono (httpx) y registra
-#   el servidor en la red con Zeroconf.
+# - Al iniciar: Crea un cliente HTTP asincrono (httpx) y lanza en segundo plano
+#   el registro del servidor en la red con Zeroconf (el sondeo mDNS puede tardar
+#   cientos de ms y no debe retrasar que Uvicorn empiece a aceptar peticiones).
 # - Al apagar: Desregistra el servicio Zeroconf y cierra los clientes
 #   (Zeroconf, httpx) para una finalizacion limpia.
 @asynccontextmanager
@@ -113,39 +225,120 @@ async def lifespan(app_instance: FastAPI):
     port = getattr(app_instance.state, 'actual_server_port', 'N/A')
     log.info(f"Lifespan: Iniciando servidor (Puerto Uvicorn configurado: {port})...")
     # Crea instancias de clientes y servicios que estaran disponibles durante la vida de la app
-    app_instance.state.http_client = httpx.AsyncClient(timeout=30.0) # Cliente HTTP para futuras llamadas
-    zc = AsyncZeroconf()
-    app_instance.state.zeroconf_instance = zc # Guarda la instancia de Zeroconf
-    app_instance.state.zeroconf_info = await register_service(zc, app_instance) # Registra el servicio
+    # Cliente HTTP compartido para futuras llamadas, con un pool de conexiones persistentes para
+    # reutilizar TCP/TLS entre peticiones. Los endpoints lo obtienen con la dependencia get_http_client.
+    res = LifespanResources()
+    app_instance.state.resources = res
+    import httpx
+    # Con un transport propio httpx ignora 'limits' y 'http2' del cliente: se configuran en el transport.
+    res.http_client = httpx.AsyncClient(
+        timeout=30.0,
+        transport=httpx.AsyncHTTPTransport(
+            retries=1,
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=200, keepalive_expiry=30.0),
+        ),
+    )
+    # Datos de red calculados una sola vez y reutilizados en cada (re)registro de Zeroconf
+    res.local_ip = get_local_ip()
+    res.local_ip_packed = socket.inet_aton(res.local_ip)
+    res.hostname = get_local_hostname()
+    res.zeroconf_port = get_actual_server_port_for_zeroconf(app_instance)
+    # Zeroconf solo escucha y anuncia en la interfaz de la IP anunciada y solo por IPv4 (el servicio
+    # se registra con una unica direccion IPv4): en hosts con varias interfaces evita anuncios
+    # duplicados y respuestas a consultas que llegan por el resto. Solo se fija la interfaz si la IP
+    # anunciable pertenece a una interfaz local (una UMEBOT_ADVERTISE_IP de NAT/VPN puede no estarlo
+    # y Zeroconf no podria enlazarse a ella); si no, o sin ifaddr para comprobarlo, se usan todas.
+    if _is_advertisable_ipv4(res.local_ip) and res.local_ip in _interface_ipv4_addresses():
+        zc_interfaces = [res.local_ip]
+    else:
+        zc_interfaces = InterfaceChoice.All
+    res.zc = AsyncZeroconf(interfaces=zc_interfaces, ip_version=IPVersion.V4Only)
+    # zc_info se rellena cuando termina la tarea de registro en segundo plano
+    res.zc_register_task = asyncio.create_task(register_service(res.zc, app_instance))
     log.info("Lifespan: Tareas de inicio completadas.")
 
     yield # La aplicacion se ejecuta aqui
 
     # --- Codigo de APAGADO del servidor ---
     log.info("Lifespan: Servidor apagando...")
+    # Espera (con limite) a que termine el registro en segundo plano para tener su ServiceInfo
+    register_task = res.zc_register_task
+    if register_task is not None:
+        try:
+            await asyncio.wait_for(asyncio.shield(register_task), timeout=SHUTDOWN_STEP_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            log.warning("Lifespan: El registro Zeroconf no termino a tiempo; se cancela.")
+            register_task.cancel()
+        if register_task.done() and not register_task.cancelled():
+            res.zc_info = register_task.result()
     # Desregistra el servicio Zeroconf
-    if hasattr(app_instance.state, 'zeroconf_info') and app_instance.state.zeroconf_info:
-        if hasattr(app_instance.state, 'zeroconf_instance'):
-            await unregister_service(app_instance.state.zeroconf_instance, app_instance.state.zeroconf_info)
+    if res.zc_info and res.zc:
+        try:
+            await asyncio.wait_for(unregister_service(res.zc, res.zc_info), timeout=SHUTDOWN_STEP_TIMEOUT_SEC)
+        except asyncio.TimeoutError:
+            log.warning("Lifespan: Timeout desregistrando el servicio Zeroconf.")
     # Cierra la instancia de Zeroconf
-    if hasattr(app_instance.state, 'zeroconf_instance'):
-        await app_instance.state.zeroconf_instance.async_close()
-        log.info("Lifespan: Instancia de Zeroconf cerrada.")
+    if res.zc:
+        try:
+            await asyncio.wait_for(res.zc.async_close(), timeout=SHUTDOWN_STEP_TIMEOUT_SEC)
+            log.info("Lifespan: Instancia de Zeroconf cerrada.")
+        except asyncio.TimeoutError:
+            log.warning("Lifespan: Timeout cerrando la instancia de Zeroconf.")
     # Cierra el cliente HTTP
-    if hasattr(app_instance.state, 'http_client'):
-        await app_instance.state.http_client.aclose()
-        log.info("Lifespan: Cliente HTTPX cerrado.")
+    if res.http_client:
+        try:
+            await asyncio.wait_for(res.http_client.aclose(), timeout=SHUTDOWN_STEP_TIMEOUT_SEC)
+            log.info("Lifespan: Cliente HTTPX cerrado.")
+        except asyncio.TimeoutError:
+            log.warning("Lifespan: Timeout cerrando el cliente HTTPX.")
     log.info("Lifespan: Apagado del servidor limpio y completado.")
 
 # --- Creacion de la Instancia de FastAPI ---
+# Con UMEBOT_ENV=prod no se publican /docs, /redoc ni /openapi.json: FastAPI no construye el esquema
+# OpenAPI y el arranque es mas ligero. En desarrollo siguen disponibles.
+_IS_PROD = os.getenv("UMEBOT_ENV") == "prod"
 app = FastAPI(
     title="UmebotLogics Server (FastAPI)",
     description="Servidor FastAPI para gestionar la logica y comunicacion de Umebot.",
     version="1.0.0",
+    default_response_class=ORJSONResponse, # Todas las rutas que devuelvan dict/list se serializan con orjson
+    docs_url=None if _IS_PROD else "/docs",
+    redoc_url=None if _IS_PROD else "/redoc",
+    openapi_url=None if _IS_PROD else "/openapi.json",
     lifespan=lifespan # Asigna el gestor de ciclo de vida
 )
 log.info(f"Instancia de FastAPI '{app.title}' creada. El puerto de ejecucion sera definido por el lanzador (ej. TabletInterface).")
 
+# Comprime con gzip las respuestas HTTP de 1 KB o mas (JSON repetitivo hacia la tablet por Wi-Fi).
+# Las respuestas pequenas como /status se envian tal cual; las conexiones WebSocket no pasan por aqui.
+# Nivel 5 para acotar el coste de CPU por peticion.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# --- Perfilado Opcional de Peticiones (pyinstrument) ---
+# Solo si UMEBOT_PROFILE=1: cualquier peticion HTTP con '?profile=1' se ejecuta bajo el perfilador
+# y devuelve su informe HTML en lugar de la respuesta normal. Sin la variable de entorno, el
+# middleware ni siquiera se registra, asi que no anade coste en produccion.
+if os.getenv("UMEBOT_PROFILE") == "1":
+    try:
+        from pyinstrument import Profiler
+        from fastapi import Request
+        from fastapi.responses import HTMLResponse
+
+        @app.middleware("http")
+        async def profile_request(request: Request, call_next):
+            if request.query_params.get("profile") != "1":
+                return await call_next(request)
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            await call_next(request)
+            profiler.stop()
+            return HTMLResponse(profiler.output_html())
+
+        log.warning("[ServerWeb.py] Perfilado activo (UMEBOT_PROFILE=1): anade '?profile=1' a una peticion para obtener su informe.")
+    except ImportError:
+        log.error("[ServerWeb.py] UMEBOT_PROFILE=1 pero 'pyinstrument' no esta instalado. Perfilado deshabilitado.")
+
 # --- Inclusion de Rutas (Endpoints) ---
 # Carga dinamicamente las rutas (endpoints) de la API desde el modulo Endpoints.py.
 # Esto mantiene el codigo del servidor principal limpio y modular.
@@ -165,3 +358,16 @@ except ImportError as e:
     log.critical("[ServerWeb.py] Asegurate de que Endpoints.py exista en 'tabletserver/' y que no haya errores de importacion, como dependencias ciclicas o errores de sintaxis dentro de Endpoints.py.")
 except Exception as e_gen:
     log.critical(f"[ServerWeb.py] FALLO CRITICO GENERAL al importar o configurar Endpoints: {e_gen}", exc_info=True)
+
+# --- Auditoria de Endpoints Sincronos ---
+# Un endpoint declarado con 'def' (no 'async def') se ejecuta en el threadpool de anyio: cada peticion
+# paga un salto de hilo y la concurrencia queda limitada al tamano del pool. Se avisa de cada uno al
+# arrancar; con UMEBOT_STRICT_ASYNC=1 (desarrollo) el arranque falla para forzar el cambio.
+_sync_endpoint_paths = [
+    route.path for route in app.routes
+    if isinstance(route, APIRoute) and not inspect.iscoroutinefunction(route.endpoint)
+]
+for _sync_path in _sync_endpoint_paths:
+    log.warning("[ServerWeb.py] El endpoint sincrono %s se ejecutara en el threadpool; declaralo con 'async def'.", _sync_path)
+if _sync_endpoint_paths and os.getenv("UMEBOT_STRICT_ASYNC") == "1":
+    raise RuntimeError(f"UMEBOT_STRICT_ASYNC=1 y hay endpoints sincronos: {', '.join(_sync_endpoint_paths)}")
@@ -12,6 +12,12 @@
 import qi
 import sys
 import time
+import logging
+
+# Toda la salida del script pasa por logging (stderr) en lugar de print: un unico formateador y un
+# unico lock de escritura, compartidos con los logs de los modulos del sistema.
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', handlers=[logging.StreamHandler()])
+log = logging.getLogger("umebot.test")
 
 # Importacion de los modulos principales del sistema necesarios para la prueba.
 try:
@@ -21,7 +27,7 @@ try:
     from audio.mic_robot_handler import RobotMicHandler
     from audio.ManagerProcessAudio import AudioProcessor
 except ImportError as e:
-    print(f"ERROR: No se pudieron importar los modulos necesarios: {e}")
+    log.critical("No se pudieron importar los modulos necesarios: %s", e)
     sys.exit(1)
 
 # --- Configuracion Estatica para la Prueba ---
@@ -32,7 +38,7 @@ STATIC_VOSK_MODEL_PATH = "/home/umecit-nueva/ros2_pepper_ws/umebot_core/audio/mo
 
 # Callback que se ejecuta cuando el AudioProcessor finaliza el reconocimiento de un segmento de texto.
 def on_text_recognized(text):
-    print(f"\n[TESTING SCRIPT] TEXTO FINAL RECONOCIDO: ===> '{text}' <===\n")
+    log.info("[TESTING SCRIPT] TEXTO FINAL RECONOCIDO: ===> '%s' <===", text)
 
 # --- Funcion Principal de la Prueba ---
 
@@ -44,7 +50,7 @@ def on_text_recognized(text):
 #   audio_streamer_from_init: La instancia del modulo de streaming de audio que se esta ejecutando en el robot.
 #   vosk_model_path_static: Ruta al modelo Vosk a utilizar.
 def run_audio_pipeline_test(app, session, audio_streamer_from_init, vosk_model_path_static):
-    print("\n[TEST] Iniciando prueba del PIPELINE DE AUDIO COMPLETO...")
+    log.info("[TEST] Iniciando prueba del PIPELINE DE AUDIO COMPLETO...")
     mic_handler = None
     audio_processor = None
     PC_MIC_HANDLER_PORT = 5000 # Puerto en el que el PC escuchara el audio del robot.
@@ -52,67 +58,58 @@ def run_audio_pipeline_test(app, session, audio_streamer_from_init, vosk_model_p
     try:
         # Verifica que el modulo de streaming de audio en el robot se haya inicializado correctamente.
         if not audio_streamer_from_init:
-            print("ERROR [TEST]: El modulo NaoqiAudioStreamerModule no fue inicializado por Init_System. Abortando prueba.")
+            log.error("[TEST] El modulo NaoqiAudioStreamerModule no fue inicializado por Init_System. Abortando prueba.")
             return
         # Verifica si el modulo en el robot reporta estar transmitiendo.
         if not audio_streamer_from_init.isStreaming():
-            print("ADVERTENCIA [TEST]: NaoqiAudioStreamerModule no reporta estar transmitiendo. Verifica que su inicializacion fue exitosa.")
+            log.warning("[TEST] NaoqiAudioStreamerModule no reporta estar transmitiendo. Verifica que su inicializacion fue exitosa.")
 
         # Inicia el manejador en el PC que escucha el audio enviado por el robot.
-        print(f"[TEST] Iniciando RobotMicHandler en el puerto {PC_MIC_HANDLER_PORT}...")
+        log.info("[TEST] Iniciando RobotMicHandler en el puerto %s...", PC_MIC_HANDLER_PORT)
         mic_handler = RobotMicHandler(pc_listen_port=PC_MIC_HANDLER_PORT)
-        print("[TEST] RobotMicHandler iniciado.")
+        log.info("[TEST] RobotMicHandler iniciado.")
 
         # Crea el procesador de audio que usara Vosk para el reconocimiento.
-        print(f"[TEST] Creando AudioProcessor con el modelo: {vosk_model_path_static}")
+        log.info("[TEST] Creando AudioProcessor con el modelo: %s", vosk_model_path_static)
         audio_processor = AudioProcessor(
             mic_handler_instance=mic_handler, # Le pasa el manejador de microfono del robot.
             vosk_model_path=vosk_model_path_static,
             text_recognized_callback=on_text_recognized # Asigna el callback para el texto final.
         )
         audio_processor.start_processing() # Inicia el hilo de procesamiento de audio.
-        print("[TEST] AudioProcessor iniciado.")
+        log.info("[TEST] AudioProcessor iniciado.")
 
-        print("\n=======================================================================")
-        print("PIPELINE DE AUDIO ACTIVO. Habla al robot durante los proximos 60 segundos.")
-        print("Presiona Ctrl+C para detener la prueba antes.")
-        print("=======================================================================")
         test_duration = 60
-        # Bucle principal de la prueba, mantiene el script vivo mientras se procesa el audio.
-        for i in range(test_duration):
-            if audio_processor and not audio_processor.is_processing():
-                print("[TEST] AudioProcessor ha dejado de procesar inesperadamente.")
-                break
-            print(f"   ...escuchando... Tiempo restante: {test_duration - i}s", end='\r')
-            time.sleep(1)
-        print("\n[TEST] Tiempo de prueba de audio finalizado.")
+        log.info("PIPELINE DE AUDIO ACTIVO. Habla al robot durante los proximos %s segundos (Ctrl+C para detener la prueba antes).", test_duration)
+        # Mantiene el script vivo mientras se procesa el audio con una unica espera bloqueante
+        # (sin despertar cada segundo). AudioProcessor ya no tiene hilo propio que pueda morir: procesa
+        # los chunks que se le pasan, asi que solo se espera al fin de la prueba. Ctrl+C interrumpe
+        # la espera igualmente.
+        time.sleep(test_duration)
+        log.info("[TEST] Tiempo de prueba de audio finalizado.")
 
     except KeyboardInterrupt:
-        print("\n[TEST] Interrupcion de teclado. Deteniendo el pipeline de prueba...")
+        log.info("[TEST] Interrupcion de teclado. Deteniendo el pipeline de prueba...")
     except RuntimeError as e_vosk:
-        print(f"ERROR CRITICO [TEST] con el motor Vosk: {e_vosk}")
+        log.critical("[TEST] Error con el motor Vosk: %s", e_vosk)
     except Exception as e:
-        print(f"\nERROR [TEST]: Ocurrio un error general durante la prueba: {e}")
-        import traceback
-        traceback.print_exc()
+        log.error("[TEST] Ocurrio un error general durante la prueba: %s", e, exc_info=True)
     finally:
         # Bloque de limpieza para detener los componentes iniciados en esta prueba.
-        print("\n[TEST] Limpieza final del pipeline de audio...")
+        log.info("[TEST] Limpieza final del pipeline de audio...")
         if audio_processor:
-            print("   Deteniendo AudioProcessor...")
+            log.info("   Deteniendo AudioProcessor...")
             audio_processor.stop_processing()
         if mic_handler:
-            print("   Deteniendo RobotMicHandler...")
+            log.info("   Deteniendo RobotMicHandler...")
             mic_handler.shutdown()
         # El NaoqiAudioStreamerModule es manejado por el bloque finally del __main__ para asegurar
         # un desregistro correcto del servicio Naoqi.
-        print("[TEST] Prueba del pipeline de audio finalizada (logica de prueba).")
+        log.info("[TEST] Prueba del pipeline de audio finalizada (logica de prueba).")
 
 # --- Punto de Entrada Principal del Script de Prueba ---
 if __name__ == "__main__":
-    print("******************************************************")
-    print("Ejecutando testing.py (Prueba del Pipeline de Audio - Vosk)...")
-    print("******************************************************")
+    log.info("Ejecutando testing.py (Prueba del Pipeline de Audio - Vosk)...")
 
     # Variables para asegurar la limpieza final
     app_instance = None
@@ -134,50 +131,46 @@ if __name__ == "__main__":
         if robot_is_ready and app_instance and session_instance:
             run_audio_pipeline_test(app_instance, session_instance, audio_streamer_module, STATIC_VOSK_MODEL_PATH)
         elif not robot_is_ready:
-            print("\nERROR [Main Test]: La inicializacion del robot fallo. No se puede ejecutar la prueba.")
+            log.error("[Main Test] La inicializacion del robot fallo. No se puede ejecutar la prueba.")
         else:
-            print("\nERROR [Main Test]: Fallo la conexion inicial con el robot. No se puede ejecutar la prueba.")
+            log.error("[Main Test] Fallo la conexion inicial con el robot. No se puede ejecutar la prueba.")
 
     except Exception as e_main_test:
-        print(f"ERROR CATASTROFICO en el script testing.py: {e_main_test}")
-        import traceback
-        traceback.print_exc()
+        log.critical("Error catastrofico en el script testing.py: %s", e_main_test, exc_info=True)
     finally:
         # --- Limpieza Final Global ---
-        print("\n[Main Test Script] Iniciando limpieza final global...")
+        log.info("[Main Test Script] Iniciando limpieza final global...")
         # Detiene y desregistra el servicio de audio en el robot.
         if audio_streamer_for_cleanup:
-            print("   Deteniendo NaoqiAudioStreamerModule (shutdown)...")
+            log.info("   Deteniendo NaoqiAudioStreamerModule (shutdown)...")
             audio_streamer_for_cleanup.shutdown()
         if audio_service_id_for_cleanup and session_instance_for_cleanup and session_instance_for_cleanup.isConnected():
             try:
-                print(f"   Desregistrando servicio de audio con ID: {audio_service_id_for_cleanup}...")
+                log.info("   Desregistrando servicio de audio con ID: %s...", audio_service_id_for_cleanup)
                 session_instance_for_cleanup.unregisterService(audio_service_id_for_cleanup)
-                print("   Servicio de audio desregistrado.")
+                log.info("   Servicio de audio desregistrado.")
             except Exception as e_unreg_main:
-                print(f"ADVERTENCIA: Error al desregistrar el servicio de audio: {e_unreg_main}")
+                log.warning("Error al desregistrar el servicio de audio: %s", e_unreg_main)
 
         # Pone al robot en estado de reposo.
         if 'service_proxies_dict' in locals() and service_proxies_dict:
             motion_proxy = service_proxies_dict.get("ALMotion")
             if motion_proxy:
                 try:
-                    print("   Quitando rigidez del cuerpo del robot (si es necesario)...")
+                    log.info("   Quitando rigidez del cuerpo del robot (si es necesario)...")
                     motion_proxy.stopMove()
                     time.sleep(0.2)
                     motion_proxy.setStiffnesses("Body", 0.0)
-                except Exception as e_stiff: print(f"ADVERTENCIA: Error quitando la rigidez del robot: {e_stiff}")
+                except Exception as e_stiff: log.warning("Error quitando la rigidez del robot: %s", e_stiff)
 
         # Cierra la conexion principal de Naoqi.
         if app_instance:
             if app_instance.session.isConnected():
-                print("   Deteniendo aplicacion qi...")
+                log.info("   Deteniendo aplicacion qi...")
                 app_instance.stop()
-                print("   Aplicacion qi detenida.")
+                log.info("   Aplicacion qi detenida.")
             else:
-                print("   La aplicacion qi ya parecia estar detenida.")
-        print("[Main Test Script] Limpieza final global completada.")
+                log.info("   La aplicacion qi ya parecia estar detenida.")
+        log.info("[Main Test Script] Limpieza final global completada.")
 
-    print("\n******************************************************")
-    print("Script testing.py finalizado.")
-    print("******************************************************")
+    log.info("Script testing.py finalizado.")
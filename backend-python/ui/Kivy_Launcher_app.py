@@ -24,6 +24,15 @@ from kivy.clock import Clock
 from kivy.uix.scrollview import ScrollView
 from kivy.properties import StringProperty
 import os # Para obtener el PID en la logica de control (no usado directamente aqui)
+import queue
+import threading
+from collections import deque
+
+# Numero maximo de lineas que conserva el area de logs. Las mas antiguas se descartan.
+MAX_LOG_LINES = 500
+# La salida del proceso externo se vuelca al area de logs cada este intervalo, hasta este numero de lineas por vez.
+PROCESS_OUTPUT_DRAIN_INTERVAL_SEC = 0.1
+PROCESS_OUTPUT_MAX_LINES_PER_DRAIN = 200
 
 # Importa el modulo que gestiona el proceso externo (ej. el lanzador de ROS2).
 # Se asume que este modulo existe y tiene las funciones necesarias.
@@ -37,7 +46,7 @@ class LauncherLayout(BoxLayout):
     status_text = StringProperty("Status: Idle")
 
     # Constructor del layout. Organiza los botones, etiquetas y el area de scroll.
-    # Tambien programa la actualizacion periodica de la UI usando Clock.schedule_interval.
+    # La actualizacion periodica de la UI solo se programa mientras hay un proceso activo.
     def __init__(self, **kwargs):
         super().__init__(orientation='vertical', padding=10, spacing=10, **kwargs)
 
@@ -59,6 +68,10 @@ class LauncherLayout(BoxLayout):
         self.add_widget(self.status_label)
 
         # --- Creacion del Area de Texto para Logs ---
+        # Las lineas se guardan en un buffer circular acotado; el texto del Label se reconstruye
+        # como mucho una vez por frame (trigger del Clock) en lugar de concatenarse en cada mensaje.
+        self._log_lines = deque(["Logs apareceran aqui..."], maxlen=MAX_LOG_LINES)
+        self._refresh_log_trigger = Clock.create_trigger(self._refresh_log_label)
         self.log_label = Label(text="Logs apareceran aqui...\n", size_hint_y=None, halign='left', valign='top')
         # Enlazar texture_size al tamano del widget es necesario para que el ScrollView calcule correctamente el scroll.
         self.log_label.bind(texture_size=self.log_label.setter('size'))
@@ -67,38 +80,95 @@ class LauncherLayout(BoxLayout):
         self.add_widget(log_scroll)
 
         # --- Programacion de la Actualizacion de la UI ---
-        # Llama al metodo update_ui cada 1.0 segundo para refrescar el estado del proceso.
-        Clock.schedule_interval(self.update_ui, 1.0)
+        # El sondeo de update_ui cada 1.0 segundo solo esta activo mientras el proceso externo corre
+        # (se programa en press_launch y se cancela cuando update_ui ve el proceso detenido), para no
+        # despertar el bucle de Kivy cuando la UI esta inactiva.
+        self._poll_ev = None
+        # Salida del proceso externo: un hilo lector la deja en esta cola y el Clock la vuelca a la UI.
+        self._output_queue = queue.Queue()
+        self._reader_thread = None
+        self._drain_ev = None
         self.update_ui(0) # Llamada inicial para establecer el estado correcto de la UI al arrancar.
+        if self._is_process_running(): self._start_status_polling() # El proceso ya podia estar lanzado
 
     # Metodo que se ejecuta al presionar el boton "Iniciar".
     # Llama a la funcion correspondiente en el modulo Launch_ROS2 para
     # iniciar el proceso externo y actualiza la UI con el resultado.
     def press_launch(self, instance):
-        self.log_label.text += "INFO: Boton 'Iniciar' presionado.\n"
+        self.add_log("INFO: Boton 'Iniciar' presionado.")
         self.status_text = "Status: Iniciando proceso..."
         success, handle = Launch_ROS2.launch_driver_setup()
         if not success:
             self.status_text = "Status: ¡Error al iniciar! Revisa la consola."
-            self.log_label.text += "ERROR: Fallo el inicio del script externo.\n"
-        # Si tuvo exito, el estado se actualizara en el proximo ciclo de update_ui.
+            self.add_log("ERROR: Fallo el inicio del script externo.")
+        else:
+            # Si tuvo exito, se activa el sondeo del estado, la lectura de su salida y se refresca la UI de inmediato.
+            self._start_output_reader(handle)
+            self._start_status_polling()
+            self.update_ui(0)
 
     # Metodo que se ejecuta al presionar el boton "Detener".
     # Llama a la funcion correspondiente en el modulo Launch_ROS2 para
     # detener el proceso externo.
     def press_stop(self, instance):
-        self.log_label.text += "INFO: Boton 'Detener' presionado.\n"
+        self.add_log("INFO: Boton 'Detener' presionado.")
         stopped = Launch_ROS2.stop_process()
         if stopped:
-            self.log_label.text += "INFO: Solicitud de detencion enviada al proceso.\n"
+            self.add_log("INFO: Solicitud de detencion enviada al proceso.")
         else:
-            self.log_label.text += "WARN: No se pudo detener el proceso (quizas ya estaba detenido).\n"
+            self.add_log("WARN: No se pudo detener el proceso (quizas ya estaba detenido).")
         # Actualiza la UI inmediatamente para reflejar el cambio de estado.
         self.update_ui(0)
 
+    # Indica si el proceso externo gestionado por Launch_ROS2 sigue en ejecucion.
+    def _is_process_running(self):
+        proc = Launch_ROS2.process_handle
+        return proc is not None and proc.poll() is None
+
+    # Lanza un hilo daemon que lee la salida del proceso linea a linea (lectura bloqueante, fuera del
+    # hilo de Kivy) y la deja en la cola, y programa su volcado a la UI cada PROCESS_OUTPUT_DRAIN_INTERVAL_SEC.
+    # Si el proceso no expone su salida (stdout no redirigido a un pipe), no hace nada.
+    def _start_output_reader(self, handle):
+        stream = getattr(handle, 'stdout', None)
+        if stream is None:
+            self.add_log("INFO: La salida del proceso no esta disponible para mostrarse aqui.")
+            return
+        self._reader_thread = threading.Thread(target=self._read_process_output, args=(stream, self._output_queue), daemon=True)
+        self._reader_thread.start()
+        if self._drain_ev is None:
+            self._drain_ev = Clock.schedule_interval(self._drain_process_output, PROCESS_OUTPUT_DRAIN_INTERVAL_SEC)
+
+    # Bucle del hilo lector: termina cuando el proceso cierra su salida (EOF).
+    @staticmethod
+    def _read_process_output(stream, output_queue):
+        try:
+            while True:
+                line = stream.readline() # b'' o '' (segun el modo del pipe) indica EOF
+                if not line: break
+                if isinstance(line, bytes): line = line.decode('utf-8', errors='replace')
+                output_queue.put(line.rstrip('\n'))
+        except (ValueError, OSError): # El stream se cerro mientras se leia
+            pass
+
+    # Vuelca a la UI, en un solo lote, las lineas de salida pendientes. Cancela el volcado periodico
+    # cuando el hilo lector termino y ya no quedan lineas.
+    def _drain_process_output(self, dt):
+        for _ in range(PROCESS_OUTPUT_MAX_LINES_PER_DRAIN):
+            try: self.add_log(self._output_queue.get_nowait())
+            except queue.Empty: break
+        if self._output_queue.empty() and not (self._reader_thread and self._reader_thread.is_alive()):
+            self._drain_ev.cancel()
+            self._drain_ev = None
+
+    # Programa el sondeo periodico de update_ui (cada 1.0 segundo) si no estaba ya activo.
+    def _start_status_polling(self):
+        if self._poll_ev is None:
+            self._poll_ev = Clock.schedule_interval(self.update_ui, 1.0)
+
     # Metodo llamado periodicamente por el Clock de Kivy para refrescar la UI.
     # Consulta el estado actual del proceso a traves de Launch_ROS2
-    # y actualiza la etiqueta de estado correspondiente.
+    # y actualiza la etiqueta de estado correspondiente. Si el proceso ya no
+    # esta en ejecucion, cancela el sondeo periodico.
     #
     # Args:
     #   dt (float): Delta time (tiempo transcurrido desde la ultima llamada),
@@ -107,18 +177,21 @@ class LauncherLayout(BoxLayout):
         current_status = Launch_ROS2.check_process_status()
         self.status_text = f"Status: {current_status}"
 
-        # Seccion conceptual para leer la salida del proceso sin bloquear la UI.
-        # En una aplicacion real, esto requeriria una implementacion mas compleja
-        # con hilos o comunicacion entre procesos.
-        proc = Launch_ROS2.process_handle # Accede al handle global del proceso
-        if proc and proc.poll() is None: # Si el proceso aun esta corriendo
-            # Para leer output continuamente sin bloquear la UI se necesitarian hilos o una logica asincrona.
-            # Por ahora, nos enfocamos solo en mostrar el estado del proceso.
-            pass
+        # La salida del proceso no se lee aqui: la lee un hilo aparte (_start_output_reader)
+        # y se vuelca a la UI con _drain_process_output, sin bloquear el bucle de Kivy.
+        if not self._is_process_running() and self._poll_ev is not None: # Proceso detenido: no hace falta seguir sondeando
+            self._poll_ev.cancel()
+            self._poll_ev = None
 
     # Metodo auxiliar para anadir mensajes al area de logs de la UI.
+    # Solo guarda la linea y programa un refresco; varios mensajes seguidos se pintan juntos.
     def add_log(self, message):
-        self.log_label.text += message + "\n"
+        self._log_lines.append(message)
+        self._refresh_log_trigger()
+
+    # Reconstruye el texto del Label a partir del buffer de lineas (llamado por el trigger del Clock).
+    def _refresh_log_label(self, dt):
+        self.log_label.text = "\n".join(self._log_lines) + "\n"
 
 # Clase principal de la aplicacion Kivy.
 # Su metodo build() es el punto de entrada que construye y devuelve
@@ -8,6 +8,7 @@ import android.util.Log
 import kotlinx.coroutines.*
 import kotlinx.coroutines.flow.*
 import okhttp3.*
+import org.json.JSONArray
 import org.json.JSONException
 import org.json.JSONObject
 import okio.ByteString
@@ -482,6 +483,8 @@ class BackendConnector(
 
         override fun onMessage(ws: WebSocket, bytes: ByteString) {
             if (activeWebSocketListener !== this) return
+            // El backend envia sus mensajes JSON como frames binarios codificados en UTF-8.
+            scope.launch { processReceivedJson(bytes.utf8()) }
         }
 
         override fun onClosing(ws: WebSocket, code: Int, reason: String) {
@@ -522,14 +525,22 @@ class BackendConnector(
 
     /**
      * Procesa una cadena de texto recibida, la parsea como JSON y la emite en el [receivedJsonFlow].
+     * El backend puede agrupar varios mensajes en un unico frame como un array JSON; en ese caso
+     * cada elemento se emite por separado y en orden.
      * Maneja excepciones de parseo de forma segura.
      *
      * @param line La cadena de texto recibida del WebSocket.
      */
     private suspend fun processReceivedJson(line: String) {
         try {
-            val json = JSONObject(line)
-            _receivedJsonFlow.emit(json)
+            if (line.trimStart().startsWith("[")) {
+                val batch = JSONArray(line)
+                for (i in 0 until batch.length()) {
+                    _receivedJsonFlow.emit(batch.getJSONObject(i))
+                }
+            } else {
+                _receivedJsonFlow.emit(JSONObject(line))
+            }
         } catch (e: JSONException) {
             Log.e(TAG, "Error al parsear JSON recibido: '$line'", e)
         }